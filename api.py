@@ -0,0 +1,181 @@
+"""Read-only JSON API katalogu (/api/v1) pro intranetové widgety.
+
+Parametry seznamů:
+    fields=id,name,price      jen vybraná pole (výchozí všechna)
+    limit=50                  velikost stránky (max API_MAX_PAGE_SIZE)
+    cursor=...                neprůhledný kurzor z `next_cursor` předchozí stránky
+    active=1|0|all            filtr podle aktivního příznaku (výchozí 1)
+    min_price=, max_price=    cenové rozpětí v Kč (včetně)
+
+Řádky se čtou jako n-tice vybraných sloupců a serializují se najednou,
+ORM objekty se nevytvářejí. Odpověď nese ETag (hash těla) a Cache-Control,
+takže klient s If-None-Match dostane 304 bez těla.
+"""
+import base64
+import hashlib
+import json
+
+from flask import Response, current_app, request, url_for
+from sqlalchemy import select
+
+from models import db, Product, Shipping
+
+# název pole v API: sloupec
+PRODUCT_FIELDS = {
+    'id':          Product.id,
+    'name':        Product.name,
+    'description': Product.description,
+    'price':       Product.price,
+    'image_url':   Product.image_filename,   # převede se na URL v _image_urls
+    'is_active':   Product.is_active,
+}
+
+SHIPPING_FIELDS = {
+    'id':          Shipping.id,
+    'name':        Shipping.name,
+    'description': Shipping.description,
+    'price':       Shipping.price,
+    'active':      Shipping.active,
+}
+
+
+class ApiError(Exception):
+    """Chyba v parametrech requestu – vrací se jako JSON {"error": ...}."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def error_response(exc):
+    return Response(json.dumps({'error': exc.message}, ensure_ascii=False),
+                    status=exc.status, mimetype='application/json')
+
+
+# ——— PARAMETRY ————————————————————————————————————————————————————————————————
+
+def _fields(available):
+    raw = request.args.get('fields')
+    if not raw:
+        return list(available)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        raise ApiError(f'Neznámá pole: {", ".join(unknown)}')
+    # id je potřeba pro kurzor, vrací se vždy
+    return ['id'] + [f for f in dict.fromkeys(fields) if f != 'id']
+
+
+def _int_arg(name):
+    raw = request.args.get(name)
+    if raw is None or raw == '':
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        raise ApiError(f'Parametr {name} musí být celé číslo')
+
+
+def _limit():
+    limit = _int_arg('limit')
+    if limit is None:
+        limit = current_app.config['API_PAGE_SIZE']
+    if limit < 1:
+        raise ApiError('Parametr limit musí být kladný')
+    return min(limit, current_app.config['API_MAX_PAGE_SIZE'])
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(f'id:{last_id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        prefix, _, last_id = raw.partition(':')
+        if prefix != 'id':
+            raise ValueError
+        return int(last_id)
+    except ValueError:
+        raise ApiError('Neplatný kurzor')
+
+
+def _filters(model, active_column):
+    filters = []
+    active = request.args.get('active', '1')
+    if active in ('1', 'true'):
+        filters.append(active_column.is_(True))
+    elif active in ('0', 'false'):
+        filters.append(active_column.isnot(True))
+    elif active != 'all':
+        raise ApiError('Parametr active musí být 1, 0 nebo all')
+    min_price, max_price = _int_arg('min_price'), _int_arg('max_price')
+    if min_price is not None:
+        filters.append(model.price >= min_price)
+    if max_price is not None:
+        filters.append(model.price <= max_price)
+    return filters
+
+
+# ——— SERIALIZACE ——————————————————————————————————————————————————————————————
+
+def _image_urls(rows, index):
+    """Nahradí název souboru obrázku v n-ticích za URL (url_for jen dvakrát)."""
+    prefix = url_for('static', filename='uploads/')
+    fallback = url_for('static', filename='img/no-image.png')
+    return [row[:index] + (prefix + row[index] if row[index] else fallback,) + row[index + 1:]
+            for row in rows]
+
+
+def _rows(fields, columns, where, limit=None):
+    query = select(*[columns[f] for f in fields]).where(*where).order_by(columns['id'])
+    if limit is not None:
+        query = query.limit(limit)
+    rows = [tuple(row) for row in db.session.execute(query)]
+    if 'image_url' in fields:
+        rows = _image_urls(rows, fields.index('image_url'))
+    return rows
+
+
+def json_response(payload):
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.sha1(body.encode()).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['API_CACHE_MAX_AGE']
+    return response.make_conditional(request)
+
+
+# ——— ENDPOINTY ————————————————————————————————————————————————————————————————
+
+def list_products():
+    fields = _fields(PRODUCT_FIELDS)
+    limit = _limit()
+    where = _filters(Product, Product.is_active)
+    cursor = request.args.get('cursor')
+    if cursor:
+        where.append(Product.id > decode_cursor(cursor))
+    # o řádek navíc, abychom věděli, jestli existuje další stránka
+    rows = _rows(fields, PRODUCT_FIELDS, where, limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return json_response({
+        'items':       [dict(zip(fields, row)) for row in rows],
+        'next_cursor': encode_cursor(rows[-1][0]) if has_more else None,
+    })
+
+
+def get_product(product_id):
+    fields = _fields(PRODUCT_FIELDS)
+    rows = _rows(fields, PRODUCT_FIELDS, [Product.id == product_id])
+    if not rows:
+        raise ApiError('Produkt neexistuje', 404)
+    return json_response(dict(zip(fields, rows[0])))
+
+
+def list_shipping():
+    # způsobů dopravy je pár, stránkování není potřeba
+    fields = _fields(SHIPPING_FIELDS)
+    rows = _rows(fields, SHIPPING_FIELDS, _filters(Shipping, Shipping.active))
+    return json_response({'items': [dict(zip(fields, row)) for row in rows]})
@@ -1,9 +1,15 @@
 from flask import Flask, render_template, url_for, flash, redirect, request, abort, session, jsonify, current_app
 from flask_login import LoginManager, login_user, logout_user, current_user, login_required
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import os
 
+import api
+import metrics
+import profiling
+import recommendations
+import shipping_registry
+import template_cache
 from config import Config
 from forms import (
     LoginForm, RegistrationForm, UpdateAccountForm,
@@ -11,8 +17,13 @@ from forms import (
 )
 from models import (
     db, User, Product, Order,
-    OrderItem, Cart, CartItem, Shipping
+    OrderItem, Cart, CartItem, Shipping, ArchivedOrder
 )
+import archive
+import carts
+import credits
+from db_upgrade import add_missing_columns, backfill_order_snapshots
+from site_settings import get_settings, save_settings, SECTIONS, DEFAULTS
 
 # —— TADY VYTVOŘTE A NAKONFIGURUJTE Flask a rozšíření ——
 app = Flask(__name__)
@@ -34,6 +45,9 @@ app.config.from_object(Config)
 app.config['UPLOAD_FOLDER'] = os.path.join('static', 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024  # max 2 MB
 
+# metriky nastavují třídu DB poolu, proto musí být před db.init_app
+metrics.init_app(app)
+
 # použijeme jedinou instanci SQLAlchemy z models.py
 db.init_app(app)
 
@@ -42,20 +56,60 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Pro přístup k této stránce se musíte přihlásit.'
 login_manager.login_message_category = 'info'
 
+profiling.init_app(app)
+template_cache.init_app(app)
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
 @app.before_request
 def create_tables():
-    # v rámci kontextu aplikace vytvoříme tabulky
-    app.before_request_funcs[None].remove(create_tables)
-    db.create_all()
+    # v rámci kontextu aplikace vytvoříme tabulky (jen při prvním requestu);
+    # hook se neodebírá ze seznamu, aby se při prvním requestu nepřeskočil ten následující
+    if not app.config.get('_TABLES_CREATED'):
+        db.create_all()
+        add_missing_columns()
+        backfill_order_snapshots()
+        credits.ensure_monotonic_user_ids()
+        recommendations.ensure_monotonic_product_ids()
+        credits.ensure_opening_balances()
+        app.config['_TABLES_CREATED'] = True
+
+@app.before_request
+def maintenance_mode():
+    endpoint = request.endpoint or ''
+    # cron úlohy (/tasks/*) běží i během údržby
+    if endpoint in ('static', 'login', 'logout', 'metrics_endpoint', 'warmup') or endpoint.startswith('task_'):
+        return
+    if get_settings().maintenance_mode and not (current_user.is_authenticated and current_user.is_admin):
+        if endpoint.startswith('api_'):
+            return api.error_response(api.ApiError('Probíhá údržba', 503))
+        return render_template('maintenance.html'), 503
+
+@app.context_processor
+def inject_site_settings():
+    return {'site_settings': get_settings()}
+
+@app.route('/_ah/warmup')
+def warmup():
+    # App Engine volá před tím, než na novou instanci pošle provoz (inbound_services: warmup)
+    loaded, errors = template_cache.warm_up(app)
+    return jsonify({'templates': loaded, 'errors': errors})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # tržby a kredity nejsou veřejné – jen Prometheus s tokenem nebo admin
+    if not metrics.authorized(app.config['METRICS_TOKEN']) \
+            and not (current_user.is_authenticated and current_user.is_admin):
+        abort(403)
+    # Prometheus text formát, součet přes všechny workery
+    return metrics.render_latest(), 200, {'Content-Type': metrics.CONTENT_TYPE}
 
 @app.route('/')
 def index():
     page = request.args.get('page', 1, type=int)
-    per_page = 12
+    per_page = get_settings().products_per_page
     pagination = Product.query.filter_by(is_active=True).paginate(page=page, per_page=per_page)
     products = pagination.items
     return render_template('index.html', products=products, pagination=pagination)
@@ -63,7 +117,26 @@ def index():
 @app.route('/product/<int:product_id>')
 def product_detail(product_id):
     product = Product.query.get_or_404(product_id)
-    return render_template('product_detail.html', product=product)
+    related_products = recommendations.related_products(product_id)
+    return render_template('product_detail.html', product=product, related_products=related_products)
+
+# —— JSON API katalogu (api.py) ——
+
+@app.errorhandler(api.ApiError)
+def api_error(exc):
+    return api.error_response(exc)
+
+@app.route('/api/v1/products')
+def api_products():
+    return api.list_products()
+
+@app.route('/api/v1/products/<int:product_id>')
+def api_product(product_id):
+    return api.get_product(product_id)
+
+@app.route('/api/v1/shipping')
+def api_shipping():
+    return api.list_shipping()
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -105,6 +178,8 @@ def login():
 
         if user and check_password_hash(user.password, form.password.data):
             login_user(user, remember=form.remember.data)
+            # košík hosta z cookie přesuneme do DB košíku uživatele
+            carts.merge_guest_cart(user)
             next_page = request.args.get('next')
             flash('Přihlášení bylo úspěšné!', 'success')
             return redirect(next_page or url_for('index'))
@@ -133,33 +208,38 @@ def profile():
         form.first_name.data = current_user.first_name
         form.last_name.data  = current_user.last_name
         form.email.data      = current_user.email
-    return render_template('profile.html', title='Profil', form=form)
+    recent_orders = Order.query.filter_by(user_id=current_user.id)\
+        .order_by(Order.created_at.desc())\
+        .limit(5)\
+        .all()
+    return render_template('profile.html', title='Profil', form=form, recent_orders=recent_orders)
 
 @app.route('/cart')
-@login_required
 def cart():
-    # 1) Načteme nebo vytvoříme košík uživatele
-    cart = Cart.query.filter_by(user_id=current_user.id).first()
-    if not cart:
-        # pokud uživatel zatím nemá košík, vytvoříme prázdný
-        cart = Cart(user_id=current_user.id)
-        db.session.add(cart)
-        db.session.commit()
+    # 1) Načteme nebo vytvoříme košík uživatele; host má košík jen v cookie
+    if current_user.is_authenticated:
+        cart = Cart.query.filter_by(user_id=current_user.id).first()
+        if not cart:
+            # pokud uživatel zatím nemá košík, vytvoříme prázdný
+            cart = Cart(user_id=current_user.id)
+            db.session.add(cart)
+            db.session.commit()
+        cart_items = cart.items
+        default_address = current_user.address
+    else:
+        cart_items = carts.guest_cart_items()
+        default_address = ''
 
-    # 2) Položky a součet
-    cart_items = cart.items
+    # 2) Součet
     total_price = sum(item.product.price * item.quantity for item in cart_items)
 
-    # 3) Metody dopravy
-    shipping_methods = Shipping.query.all()
-    # vybraná metoda (můžete nechat None, pokud ještě nevybráno)
-    selected_shipping_method = session.get(
-        'shipping_method',
-        shipping_methods[0].id if shipping_methods else None
-    )
+    # 3) Metody dopravy – jen aktivní, z paměti procesu
+    shipping_methods = shipping_registry.active_methods()
+    chosen_shipping = shipping_registry.resolve(session.get('shipping_method'))
+    selected_shipping_method = chosen_shipping.id if chosen_shipping else None
 
     # 4) Základní adresa a poznámka (pokud je uložena v session)
-    shipping_address = session.get('shipping_address', current_user.address)
+    shipping_address = session.get('shipping_address', default_address)
     note             = session.get('note', '')
 
     return render_template(
@@ -176,53 +256,91 @@ def cart():
 def add_to_cart(product_id):
     product = Product.query.get_or_404(product_id)
     quantity = int(request.form.get('quantity', 1))
-    if current_user.is_authenticated:
+    if not current_user.is_authenticated:
+        # host: žádný zápis do DB, košík zůstává v podepsané cookie
+        if not carts.add_to_guest_cart(product_id, quantity):
+            flash('Košík je plný, přihlaste se prosím.', 'warning')
+            return redirect(url_for('cart'))
+    else:
         cart = Cart.query.filter_by(user_id=current_user.id).first()
         if not cart:
             cart = Cart(user_id=current_user.id)
             db.session.add(cart)
-            db.session.commit()
-    else:
-        cart_id = session.get('cart_id')
-        if cart_id:
-            cart = Cart.query.get(cart_id)
-        else:
-            cart = Cart()
-            db.session.add(cart)
-            db.session.commit()
-            session['cart_id'] = cart.id
+            db.session.flush()
+        cart.updated_at = datetime.utcnow()
 
-    cart_item = CartItem.query.filter_by(cart_id=cart.id, product_id=product_id).first()
-    if cart_item:
-        cart_item.quantity += quantity
-    else:
-        cart_item = CartItem(cart_id=cart.id, product_id=product_id, quantity=quantity)
-        db.session.add(cart_item)
-    db.session.commit()
+        cart_item = CartItem.query.filter_by(cart_id=cart.id, product_id=product_id).first()
+        if cart_item:
+            cart_item.quantity += quantity
+        else:
+            cart_item = CartItem(cart_id=cart.id, product_id=product_id, quantity=quantity)
+            db.session.add(cart_item)
+        db.session.commit()
+    metrics.inc('cart_add_total')
+    metrics.inc('cart_add_items_total', quantity)
     flash(f'{product.name} byl přidán do košíku!', 'success')
     return redirect(url_for('cart'))
 
 @app.route('/remove_from_cart/<int:item_id>', methods=['POST'])
 def remove_from_cart(item_id):
-    item = CartItem.query.get_or_404(item_id)
-    db.session.delete(item)
-    db.session.commit()
+    if not current_user.is_authenticated:
+        # u hosta je item_id ID produktu
+        guest = carts.load_guest_cart()
+        guest.pop(item_id, None)
+        carts.save_guest_cart(guest)
+    else:
+        item = CartItem.query.get_or_404(item_id)
+        db.session.delete(item)
+        db.session.commit()
     flash('Položka byla odstraněna z košíku.', 'success')
     return redirect(url_for('cart'))
 
 @app.route('/update_cart', methods=['POST'])
 def update_cart():
+    guest = None if current_user.is_authenticated else carts.load_guest_cart()
     for key, value in request.form.items():
         if key.startswith('quantity_'):
             item_id  = int(key.split('_')[1])
             quantity = int(value)
+            if guest is not None:
+                if item_id in guest:
+                    guest[item_id] = quantity
+                continue
             cart_item = CartItem.query.get(item_id)
             if cart_item:
                 cart_item.quantity = quantity
-    db.session.commit()
+                cart_item.cart.updated_at = datetime.utcnow()
+    if guest is not None:
+        carts.save_guest_cart(guest)
+    else:
+        db.session.commit()
     flash('Košík byl aktualizován.', 'success')
     return redirect(url_for('cart'))
 
+@app.route('/tasks/sweep_carts')
+def task_sweep_carts():
+    # volá App Engine cron (cron.yaml); hlavičku X-Appengine-Cron App Engine z vnějších requestů odstraní
+    if request.headers.get('X-Appengine-Cron') != 'true' \
+            and not (current_user.is_authenticated and current_user.is_admin):
+        abort(403)
+    return jsonify(carts.sweep_carts(app.config['CART_ABANDONED_DAYS']))
+
+@app.route('/tasks/archive_orders')
+def task_archive_orders():
+    # volá App Engine cron (cron.yaml)
+    if request.headers.get('X-Appengine-Cron') != 'true' \
+            and not (current_user.is_authenticated and current_user.is_admin):
+        abort(403)
+    return jsonify({'archived': archive.archive_orders(app.config['ARCHIVE_AFTER_DAYS'])})
+
+@app.route('/tasks/build_recommendations')
+def task_build_recommendations():
+    # volá App Engine cron (cron.yaml): každou hodinu nové objednávky, v noci plný přepočet (?full=1)
+    if request.headers.get('X-Appengine-Cron') != 'true' \
+            and not (current_user.is_authenticated and current_user.is_admin):
+        abort(403)
+    return jsonify({'items': recommendations.refresh(full=request.args.get('full') == '1')})
+
 @app.route('/apply_credits', methods=['POST'])
 @login_required
 def apply_credits():
@@ -233,7 +351,7 @@ def apply_credits():
     to_apply = min(current_user.credits, total)
     # uložíme do session, aby to stále zůstalo
     session['applied_credits'] = to_apply
-    flash(f'Uplatněno {to_apply} kreditů, cena se snížila o {to_apply} Kč.', 'success')
+    flash(f'Uplatněno {to_apply} kreditů, cena se snížila o {to_apply} {get_settings().currency_symbol}.', 'success')
     return redirect(url_for('cart'))
 
 @app.route('/checkout', methods=['GET', 'POST'])
@@ -244,25 +362,24 @@ def checkout():
     cart_items = cart.items if cart else []
     subtotal = sum(item.product.price * item.quantity for item in cart_items)
 
-    # načteme dopravce
-    shipping_methods = Shipping.query.all()
-    selected_id = session.get('shipping_method',
-                              shipping_methods[0].id if shipping_methods else None)
-    chosen_shipping = Shipping.query.get(selected_id) if selected_id else None
-    shipping_cost = chosen_shipping.price if chosen_shipping else 0
-
     # session-held hodnoty
     shipping_address = session.get('shipping_address', current_user.address)
     note             = session.get('note', '')
     applied_credits  = session.get('applied_credits', 0)
 
-    # POST = buď uplatnit kredity, nebo potvrdit objednávku
     if request.method == 'POST':
         # uložíme vždy aktuální volby dopravy/ adresy/ poznámky
-        session['shipping_method']  = int(request.form.get('shipping_method', selected_id))
-        session['shipping_address'] = request.form.get('shipping_address', shipping_address)
-        session['note']             = request.form.get('note', note)
+        session['shipping_method']  = request.form.get('shipping_method', session.get('shipping_method'), type=int)
+        session['shipping_address'] = shipping_address = request.form.get('shipping_address', shipping_address)
+        session['note']             = note = request.form.get('note', note)
 
+    # dopravce (jen aktivní) – cena i název z paměti procesu, bez dotazu do DB
+    shipping_methods = shipping_registry.active_methods()
+    chosen_shipping = shipping_registry.resolve(session.get('shipping_method'))
+    shipping_cost = chosen_shipping.price if chosen_shipping else 0
+
+    # POST = buď uplatnit kredity, nebo potvrdit objednávku
+    if request.method == 'POST':
         # 1) Uplatnit kredity?
         if 'apply_credits' in request.form:
             max_app = min(current_user.credits, subtotal + shipping_cost)
@@ -271,36 +388,61 @@ def checkout():
 
         # 2) Potvrdit objednávku?
         if 'confirm_order' in request.form:
-            # odečteme kredity z uživatele
-            current_user.credits -= applied_credits
+            if chosen_shipping is None:
+                flash('Není k dispozici žádný způsob dopravy.', 'danger')
+                return redirect(url_for('cart'))
+            # dopravce zmizel/byl deaktivován – nepodstrčíme zákazníkovi jiný, ať ho nejdřív uvidí
+            if chosen_shipping.id != session.get('shipping_method'):
+                session['shipping_method'] = chosen_shipping.id
+                flash('Zvolený způsob dopravy už není k dispozici, zkontrolujte prosím dopravu a cenu.', 'warning')
+                return redirect(url_for('checkout'))
             # vytvoříme objednávku
             order = Order(
                 user_id          = current_user.id,
-                shipping_id      = selected_id,
+                shipping_id      = chosen_shipping.id,
                 shipping_address = session['shipping_address'],
                 total_price      = subtotal + shipping_cost,
                 credits_used     = applied_credits,
                 final_price      = subtotal + shipping_cost - applied_credits,
                 note             = session.get('note',''),
-                status           = 'new'
+                status           = 'new',
+                item_count       = sum(item.quantity for item in cart_items),
+                shipping_name    = chosen_shipping.name,
+                shipping_price   = shipping_cost
             )
             db.session.add(order)
             db.session.flush()
-            # položky
+            # odečteme kredity jedním UPDATE (se zápisem do ledgeru); mezitím je mohl utratit jiný checkout
+            if not credits.spend(current_user.id, applied_credits, order.id):
+                db.session.rollback()
+                session.pop('applied_credits', None)
+                flash('Nemáte dostatek kreditů, uplatněte je prosím znovu.', 'danger')
+                return redirect(url_for('checkout'))
+            # položky – se snapshotem produktu pro historii objednávek
             for item in cart_items:
                 db.session.add(OrderItem(
-                    order_id   = order.id,
-                    product_id = item.product_id,
-                    quantity   = item.quantity,
-                    price      = item.product.price
+                    order_id      = order.id,
+                    product_id    = item.product_id,
+                    quantity      = item.quantity,
+                    price         = item.product.price,
+                    product_name  = item.product.name,
+                    product_image = item.product.image_filename,
+                    line_total    = item.product.price * item.quantity
                 ))
             # vyprázdnit košík
             CartItem.query.filter_by(cart_id=cart.id).delete()
             db.session.commit()
+            metrics.inc('checkout_orders_total')
+            metrics.inc('checkout_revenue_czk_total', order.final_price)
+            metrics.inc('checkout_credits_used_total', order.credits_used)
             session.pop('applied_credits', None)
             flash('Objednávka byla úspěšně dokončena.', 'success')
             return redirect(url_for('index'))
 
+    # zapamatujeme si dopravce, kterého zákazník na stránce skutečně vidí
+    if chosen_shipping and chosen_shipping.id != session.get('shipping_method'):
+        session['shipping_method'] = chosen_shipping.id
+
     # výpočet celkové dlužné částky
     total_due = subtotal + shipping_cost - applied_credits
 
@@ -319,7 +461,7 @@ def checkout():
 @app.route('/order_confirmation/<int:order_id>')
 @login_required
 def order_confirmation(order_id):
-    order = Order.query.get_or_404(order_id)
+    order = archive.get_order_or_404(order_id)
     if order.user_id != current_user.id and not current_user.is_admin:
         abort(403)
     return render_template('order_confirmation.html', order=order)
@@ -328,10 +470,13 @@ def order_confirmation(order_id):
 @login_required
 def orders():
     page       = request.args.get('page', 1, type=int)
-    pagination = Order.query.filter_by(user_id=current_user.id)\
-        .order_by(Order.created_at.desc())\
+    # starší objednávky jsou v archivu, zobrazí se jen na vyžádání
+    archived   = request.args.get('archive', 0, type=int) == 1
+    model      = ArchivedOrder if archived else Order
+    pagination = model.query.filter_by(user_id=current_user.id)\
+        .order_by(model.created_at.desc())\
         .paginate(page=page, per_page=10)
-    return render_template('orders.html', orders=pagination.items, pagination=pagination)
+    return render_template('orders.html', orders=pagination.items, pagination=pagination, archived=archived)
 def order_history():
     # Načteme všechny objednávky přihlášeného uživatele
     orders = Order.query \
@@ -343,7 +488,7 @@ def order_history():
 @app.route('/order/<int:order_id>')
 @login_required
 def order_detail(order_id):
-    order = Order.query.get_or_404(order_id)
+    order = archive.get_order_or_404(order_id)
     if order.user_id != current_user.id and not current_user.is_admin:
         abort(403)
     return render_template('order_detail.html', order=order)
@@ -355,7 +500,124 @@ def order_detail(order_id):
 def admin_dashboard():
     if not current_user.is_admin:
         abort(403)
-    return render_template('admin/dashboard.html')
+    # časy v DB jsou v UTC (datetime.utcnow)
+    now   = datetime.utcnow()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    valid = Order.status != 'cancelled'
+    stats = {
+        'orders_today':   Order.query.filter(Order.created_at >= today).count(),
+        'revenue_month':  db.session.query(db.func.coalesce(db.func.sum(Order.final_price), 0))
+                            .filter(valid, Order.created_at >= today.replace(day=1)).scalar(),
+        'new_users_week': User.query.filter(User.created_at >= today - timedelta(days=7)).count(),
+        'pending_orders': Order.query.filter(Order.status.in_(('new', 'pending'))).count(),
+    }
+
+    # graf – počet a obrat objednávek po dnech za posledních 30 dní, jeden GROUP BY
+    start = today - timedelta(days=29)
+    per_day = {
+        day: (count, revenue) for day, count, revenue in db.session.query(
+            db.func.date(Order.created_at), db.func.count(Order.id), db.func.sum(Order.final_price)
+        ).filter(valid, Order.created_at >= start).group_by(db.func.date(Order.created_at))
+    }
+    days = [(start + timedelta(days=i)).date() for i in range(30)]
+    order_chart_data = {
+        'labels':  [d.strftime('%d.%m.') for d in days],
+        'orders':  [per_day.get(d.isoformat(), (0, 0))[0] for d in days],
+        'revenue': [per_day.get(d.isoformat(), (0, 0))[1] or 0 for d in days],
+    }
+
+    top_products = [
+        {'id': product.id, 'name': product.name, 'sold_count': sales.units_sold, 'revenue': sales.revenue}
+        for product, sales in recommendations.best_sellers(5)
+    ]
+    recent_orders = Order.query.options(db.selectinload(Order.user))\
+        .order_by(Order.id.desc()).limit(5).all()
+    recent_users = User.query.filter(User.created_at.isnot(None))\
+        .order_by(User.created_at.desc()).limit(5).all()
+    return render_template(
+        'admin/dashboard.html',
+        current_time       = now,
+        stats              = stats,
+        order_chart_data   = order_chart_data,
+        top_products       = top_products,
+        low_stock_products = [],   # produkty zatím nemají skladovou zásobu
+        recent_orders      = recent_orders,
+        recent_users       = recent_users
+    )
+
+@app.route('/admin/settings')
+@login_required
+def admin_settings():
+    if not current_user.is_admin:
+        abort(403)
+    return render_template(
+        'admin/settings.html',
+        settings         = get_settings(),
+        shipping_methods = Shipping.query.order_by(Shipping.id).all()
+    )
+
+@app.route('/admin/settings', methods=['POST'])
+@login_required
+def admin_update_settings():
+    if not current_user.is_admin:
+        abort(403)
+
+    section = request.form.get('section')
+    if section not in SECTIONS:
+        abort(400)
+
+    values = {}
+    for key in SECTIONS[section]:
+        if DEFAULTS[key][1] is bool:
+            # nezaškrtnutý checkbox se ve formuláři vůbec neposílá
+            values[key] = key in request.form
+        elif key in request.form:
+            values[key] = request.form[key].strip()
+
+    if 'products_per_page' in values:
+        try:
+            values['products_per_page'] = min(max(int(values['products_per_page']), 1), 100)
+        except ValueError:
+            flash('Počet produktů na stránku musí být číslo.', 'danger')
+            return redirect(url_for('admin_settings'))
+
+    # logo a favicon (jen sekce general)
+    if section == 'general':
+        for field in ('logo', 'favicon'):
+            upload = request.files.get(field)
+            if upload and upload.filename:
+                os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
+                fn = secure_filename(upload.filename)
+                with metrics.timer('image_processing_seconds', operation='upload'):
+                    upload.save(os.path.join(current_app.config['UPLOAD_FOLDER'], fn))
+                values[field] = fn
+            elif f'remove_{field}' in request.form:
+                values[field] = ''
+
+    save_settings(values)
+    flash('Nastavení bylo uloženo.', 'success')
+    return redirect(url_for('admin_settings'))
+
+@app.route('/admin/profiling')
+@login_required
+def admin_profiling():
+    if not current_user.is_admin:
+        abort(403)
+    profiles  = profiling.load_profiles(app.config['PROFILING_DIR'])
+    endpoints = profiling.summarize(profiles, app.config['PROFILING_INTERVAL'])
+    return render_template('admin/profiling.html', endpoints=endpoints,
+                           enabled=app.config['PROFILING_ENABLED'])
+
+@app.route('/admin/profiling/<name>.folded')
+@login_required
+def admin_profiling_folded(name):
+    if not current_user.is_admin:
+        abort(403)
+    profiles = profiling.load_profiles(app.config['PROFILING_DIR'])
+    if name not in profiles:
+        abort(404)
+    # formát pro flamegraph.pl / speedscope
+    return profiling.folded_text(profiles[name]), 200, {'Content-Type': 'text/plain; charset=utf-8'}
 
 @app.route('/admin/products')
 @login_required
@@ -403,7 +665,8 @@ def admin_add_product():
             # 2) Bezpečné jméno a uložení
             filename = secure_filename(image_file.filename)
             save_path = os.path.join(upload_folder, filename)
-            image_file.save(save_path)
+            with metrics.timer('image_processing_seconds', operation='upload'):
+                image_file.save(save_path)
             image_filename = filename
 
         # Vytvoření produktu
@@ -442,7 +705,8 @@ def admin_edit_product(product_id):
         os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
         fn = secure_filename(image.filename)
         path = os.path.join(current_app.config['UPLOAD_FOLDER'], fn)
-        image.save(path)
+        with metrics.timer('image_processing_seconds', operation='upload'):
+            image.save(path)
         product.image_filename = fn
 
     # specifikace
@@ -460,6 +724,8 @@ def admin_delete_product(product_id):
     if not current_user.is_admin:
         abort(403)
     product = Product.query.get_or_404(product_id)
+    # z košíků produkt zmizí, objednávky si drží vlastní snapshot
+    CartItem.query.filter_by(product_id=product.id).delete()
     db.session.delete(product)
     db.session.commit()
     flash('Produkt byl úspěšně odstraněn!', 'success')
@@ -471,7 +737,10 @@ def admin_orders():
     if not current_user.is_admin:
         abort(403)
     page       = request.args.get('page', 1, type=int)
-    pagination = Order.query.order_by(Order.created_at.desc())\
+    # uživatele a položky pro modální okna načteme dvěma dotazy místo dvou na řádek
+    pagination = Order.query\
+        .options(db.selectinload(Order.user), db.selectinload(Order.items))\
+        .order_by(Order.created_at.desc())\
         .paginate(page=page, per_page=20)
     return render_template('admin/orders.html', orders=pagination.items, pagination=pagination)
 
@@ -480,7 +749,7 @@ def admin_orders():
 def admin_order_detail(order_id):
     if not current_user.is_admin:
         abort(403)
-    order = Order.query.get_or_404(order_id)
+    order = archive.get_order_or_404(order_id)
     return render_template('admin/order_detail.html', order=order)
 
 @app.route('/admin/order/<int:order_id>/status', methods=['POST'])
@@ -527,6 +796,7 @@ def admin_shipping():
             new = Shipping(name=name, price=price, active=active)
             db.session.add(new)
             db.session.commit()
+            shipping_registry.invalidate()
             flash('Způsob dopravy přidán.', 'success')
 
         # 2) Úprava existující
@@ -536,6 +806,7 @@ def admin_shipping():
             method.price  = int(request.form['price'])
             method.active = 'active' in request.form
             db.session.commit()
+            shipping_registry.invalidate()
             flash('Způsob dopravy upraven.', 'success')
 
         # 3) Smazání
@@ -543,6 +814,7 @@ def admin_shipping():
             method = Shipping.query.get_or_404(int(request.form['delete_id']))
             db.session.delete(method)
             db.session.commit()
+            shipping_registry.invalidate()
             flash('Způsob dopravy smazán.', 'success')
 
         return redirect(url_for('admin_shipping'))
@@ -563,6 +835,7 @@ def admin_edit_shipping(shipping_id):
     method.price  = int(request.form.get('price', method.price))
     method.active = 'active' in request.form
     db.session.commit()
+    shipping_registry.invalidate()
     flash('Způsob dopravy upraven.', 'success')
     return redirect(url_for('admin_shipping'))
 
@@ -576,6 +849,7 @@ def admin_delete_shipping(shipping_id):
     method = Shipping.query.get_or_404(shipping_id)
     db.session.delete(method)
     db.session.commit()
+    shipping_registry.invalidate()
     flash('Způsob dopravy byl úspěšně odstraněn!', 'success')
     return redirect(url_for('admin_shipping'))
 
@@ -623,21 +897,69 @@ def admin_update_credits(user_id):
     action = request.form.get('action')
     try:
         amount = int(request.form.get('amount', 0))
-        if action == "add":
-            user.credits += amount
-        elif action == "subtract":
-            user.credits = max(user.credits - amount, 0)
-        elif action == "set":
-            user.credits = amount
-        else:
-            raise ValueError
+        credits.adjust(action, amount, User.id == user.id, reason='admin', created_by=current_user.id)
         db.session.commit()
         flash(f'Kredity uživatele {user.email} aktualizovány.', 'success')
     except ValueError:
+        db.session.rollback()
+        flash('Neplatná hodnota kreditů.', 'danger')
+
+    return redirect(url_for('admin_users'))
+
+@app.route('/admin/credits/bulk', methods=['POST'])
+@login_required
+def admin_bulk_credits():
+    if not current_user.is_admin:
+        abort(403)
+
+    target = request.form.get('target', 'all')
+    note   = request.form.get('note', '').strip()[:200] or None
+    try:
+        if target == 'csv':
+            upload = request.files.get('csv_file')
+            if not upload or not upload.filename:
+                raise credits.CreditError('Vyberte CSV soubor')
+            text = upload.read().decode('utf-8-sig')
+            count = credits.adjust_from_csv(text, created_by=current_user.id, note=note)
+        else:
+            action = request.form.get('action')
+            amount = int(request.form.get('amount', 0))
+            where = None
+            if target == 'filter':
+                where = credits.user_filter(request.form.get('email_contains', '').strip(),
+                                            'include_admins' in request.form)
+            count = credits.adjust(action, amount, where, reason='bulk',
+                                   created_by=current_user.id, note=note)
+        db.session.commit()
+        flash(f'Kredity změněny u {count} uživatelů.', 'success')
+    except credits.CreditError as e:
+        db.session.rollback()
+        flash(f'Hromadná změna kreditů neproběhla: {e}', 'danger')
+    except (ValueError, UnicodeDecodeError):
+        db.session.rollback()
         flash('Neplatná hodnota kreditů.', 'danger')
 
     return redirect(url_for('admin_users'))
 
+@app.route('/admin/user/<int:user_id>/credits/history')
+@login_required
+def admin_credit_history(user_id):
+    if not current_user.is_admin:
+        abort(403)
+
+    user = User.query.get_or_404(user_id)
+    balance, entries, snapshot = credits.history(user_id)
+    return render_template('admin/credit_history.html', user=user, balance=balance,
+                           entries=entries, snapshot=snapshot)
+
+@app.route('/tasks/snapshot_credits')
+def task_snapshot_credits():
+    # volá App Engine cron (cron.yaml)
+    if request.headers.get('X-Appengine-Cron') != 'true' \
+            and not (current_user.is_authenticated and current_user.is_admin):
+        abort(403)
+    return jsonify({'snapshots': credits.snapshot_balances()})
+
 @app.route('/admin/user/<int:user_id>/delete', methods=['POST'])
 @login_required
 def admin_delete_user(user_id):
@@ -671,10 +993,14 @@ def admin_add_user():
             password        = hashed,
             is_admin        = bool(request.form.get('is_admin')),
             is_password_set = True,
-            credits         = int(request.form.get('credits', 0)),
+            credits         = 0,
             address         = request.form.get('address', '')
         )
         db.session.add(user)
+        db.session.flush()
+        # počáteční kredity jdou přes ledger jako každá jiná změna
+        credits.adjust('add', max(int(request.form.get('credits', 0)), 0), User.id == user.id,
+                       reason='opening', created_by=current_user.id)
         db.session.commit()
         flash(f'Uživatel {user.email} byl přidán.', 'success')
     else:
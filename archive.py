@@ -0,0 +1,92 @@
+"""Přesun starých objednávek do archivní databáze.
+
+archive_orders() bere doručené a zrušené objednávky starší než zadaný počet
+dní po dávkách: dávku zapíše do archivu, commitne a teprve pak ji smaže
+z živé DB. Každá dávka je krátká transakce, živá DB tedy není zamčená po
+celou dobu. Přerušený běh (zapsáno, nesmazáno) se při dalším běhu dokončí:
+řádky, které už v archivu jsou, se jen smažou z živé DB.
+
+Živé tabulky order a order_item musí mít AUTOINCREMENT se sekvencí nad
+nejvyšším archivovaným ID, jinak by SQLite ID archivovaných objednávek
+přidělil novým a archiv by se s živou DB pomíchal. archive_orders() to
+před prvním přesunem zajistí (db_upgrade.ensure_autoincrement).
+
+get_order_or_404() hledá nejdřív v živé DB, pak v archivu – detail
+objednávky funguje stejně pro obě.
+"""
+from datetime import datetime, timedelta
+
+from flask import abort
+from sqlalchemy import func, insert, select, text
+
+from db_upgrade import ensure_autoincrement
+from models import db, Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+
+ARCHIVED_STATUSES = ('delivered', 'cancelled')
+
+
+def get_order_or_404(order_id):
+    order = db.session.get(Order, order_id) or db.session.get(ArchivedOrder, order_id)
+    if order is None:
+        abort(404)
+    return order
+
+
+def _copy_rows(source, target, where):
+    """Zkopíruje řádky do archivu; shodné už archivované řádky (přerušený běh) přeskočí.
+
+    Běžný INSERT – jiný řádek se stejným ID skončí chybou IntegrityError
+    místo přepsání archivované objednávky.
+    """
+    columns = [c.name for c in target.__table__.columns if c.name in source.__table__.columns]
+    rows = db.session.execute(
+        select(*[source.__table__.c[name] for name in columns]).where(where)
+    ).mappings().all()
+    archived = {r['id']: dict(r) for r in db.session.execute(
+        select(*[target.__table__.c[name] for name in columns])
+        .where(target.id.in_([r['id'] for r in rows]))
+    ).mappings()}
+    rows = [dict(r) for r in rows if archived.get(r['id']) != dict(r)]
+    if rows:
+        db.session.execute(insert(target), rows)
+    return len(rows)
+
+
+def _ensure_monotonic_ids():
+    for live, archived in ((Order, ArchivedOrder), (OrderItem, ArchivedOrderItem)):
+        high_water = db.session.execute(select(func.max(archived.id))).scalar() or 0
+        ensure_autoincrement(live, high_water)
+
+
+def archive_orders(older_than_days, batch_size=500, max_batches=1000):
+    """Přesune staré uzavřené objednávky do archivu; vrací počet přesunutých."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    db.session.commit()
+    _ensure_monotonic_ids()
+    moved = 0
+    for _ in range(max_batches):
+        ids = db.session.execute(
+            select(Order.id)
+            .where(Order.status.in_(ARCHIVED_STATUSES), Order.created_at < cutoff)
+            .order_by(Order.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        # 1) zápis do archivu a commit
+        _copy_rows(Order, ArchivedOrder, Order.id.in_(ids))
+        _copy_rows(OrderItem, ArchivedOrderItem, OrderItem.order_id.in_(ids))
+        db.session.commit()
+
+        # 2) až po úspěšném zápisu smažeme z živé DB
+        OrderItem.query.filter(OrderItem.order_id.in_(ids)).delete(synchronize_session=False)
+        Order.query.filter(Order.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        moved += len(ids)
+
+    if moved:
+        # aktualizace statistik plánovače po velkém úbytku řádků
+        db.session.execute(text('PRAGMA optimize'))
+        db.session.commit()
+    return moved
@@ -0,0 +1,16 @@
+"""Archivace starých objednávek a úklid košíků: python archive_orders.py [dní]"""
+import sys
+
+from app import app, db
+from archive import archive_orders
+from carts import sweep_carts
+from db_upgrade import add_missing_columns
+
+with app.app_context():
+    db.create_all()
+    add_missing_columns()
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else app.config['ARCHIVE_AFTER_DAYS']
+    print(f'Archivováno objednávek: {archive_orders(days)}')
+    result = sweep_carts(app.config['CART_ABANDONED_DAYS'])
+    print(f"Smazáno košíků – hostů: {result['guest']}, prázdných: {result['empty']}, "
+          f"opuštěných: {result['abandoned']}")
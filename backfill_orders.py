@@ -0,0 +1,16 @@
+"""Doplní snapshot produktů a dopravy do existujících objednávek.
+
+Totéž dělá aplikace při prvním requestu (create_tables); skript se hodí
+po nasazení, aby první request nečekal: python backfill_orders.py
+Pracuje po dávkách podle ID, aby nedržel zámek nad celou DB.
+"""
+from app import app, db
+from db_upgrade import add_missing_columns, backfill_order_snapshots
+
+with app.app_context():
+    db.create_all()
+    for column in add_missing_columns():
+        print(f'Přidán sloupec {column}')
+    items, orders = backfill_order_snapshots()
+    print(f'Položky objednávek: doplněno {items}')
+    print(f'Objednávky: doplněno {orders}')
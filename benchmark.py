@@ -0,0 +1,427 @@
+"""Výkonnostní benchmark e-shopu nad syntetickými daty.
+
+Vygeneruje deterministická data (uživatelé, produkty, doprava, košíky,
+objednávky) do samostatné SQLite databáze, prožene skutečné routy přes
+Flask test client (volitelně ve více procesech) a vypíše propustnost,
+percentily latence a počet SQL dotazů na request. Výsledek umí porovnat
+s uloženým baseline a označit regrese.
+
+Příklady:
+    python benchmark.py --orders 1000
+    python benchmark.py --orders 100000 --processes 4 --requests 200
+    python benchmark.py --orders 1000 --save-baseline
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+CHUNK_SIZE = 10000
+# každý košík má stejný počet položek – počet dotazů pak nezávisí na tom, kterého
+# uživatele si proces vylosuje (--processes pracuje s jinými seedy)
+CART_ITEMS = 3
+
+# Globální stav benchmarku – v každém procesu vlastní kopie
+_app = None
+_query_count = 0
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    global _query_count
+    _query_count += 1
+
+
+def setup_app(db_path):
+    """Importuje aplikaci nad benchmarkovou DB a zapne počítání dotazů.
+
+    Metriky, verze cache a profily jdou do dočasného adresáře, ne do
+    instance/ skutečné aplikace.
+    """
+    global _app
+    instance_path = tempfile.mkdtemp(prefix='eshop-bench-instance-')
+    # musí být nastaveno ještě před importem app, Config se čte při importu
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(db_path)
+    os.environ['ARCHIVE_DATABASE_URL'] = 'sqlite:///' + os.path.splitext(os.path.abspath(db_path))[0] + '_archive.db'
+    os.environ['METRICS_DIR'] = os.path.join(instance_path, 'metrics')
+    os.environ['VERSIONS_DIR'] = os.path.join(instance_path, 'versions')
+    from sqlalchemy import event
+    from app import app
+    from models import db
+
+    app.instance_path = instance_path
+    app.config['PROFILING_DIR'] = os.path.join(instance_path, 'profiles')
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+        event.listen(db.engine, 'before_cursor_execute', _count_query)
+    _app = app
+    return app
+
+
+# ——— GENERÁTOR DAT ——————————————————————————————————————————————————————————
+
+def _bulk_insert(model, rows):
+    from sqlalchemy import insert
+    from models import db
+
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(insert(model), rows[start:start + CHUNK_SIZE])
+    db.session.commit()
+
+
+def generate_data(orders, users=None, products=200, shipping=4, carts=None, seed=42):
+    """Naplní prázdnou DB deterministickými daty v zadaném měřítku.
+
+    Vrací slovník s ID, která benchmark potřebuje (admin, uživatelé s košíkem,
+    produkty, objednávky).
+    """
+    from werkzeug.security import generate_password_hash
+    from models import db, User, Product, Shipping, Order, OrderItem, Cart
+
+    rng = random.Random(seed)
+    users = users or max(10, orders // 10)
+    carts = carts if carts is not None else max(1, users // 5)
+    # hashování hesla je drahé, všichni sdílí jeden hash
+    password = generate_password_hash('benchmark')
+
+    _bulk_insert(User, [{
+        'id':              i,
+        'first_name':      f'Jméno{i}',
+        'last_name':       f'Příjmení{i}',
+        'email':           f'user{i}@benchmark.local',
+        'address':         f'Ulice {i}\n110 00 Praha',
+        'password':        password,
+        'credits':         rng.randint(0, 500),
+        'is_admin':        i == 1,
+        'is_password_set': True,
+    } for i in range(1, users + 1)])
+
+    product_prices = {i: rng.randint(50, 5000) for i in range(1, products + 1)}
+    _bulk_insert(Product, [{
+        'id':             i,
+        'name':           f'Produkt {i}',
+        'description':    f'Popis produktu {i}. ' * rng.randint(1, 10),
+        'price':          product_prices[i],
+        'image_filename': None,
+        'is_active':      rng.random() > 0.1,
+    } for i in range(1, products + 1)])
+
+    shipping_prices = {i: rng.choice([0, 79, 99, 149]) for i in range(1, shipping + 1)}
+    _bulk_insert(Shipping, [{
+        'id':          i,
+        'name':        f'Doprava {i}',
+        'price':       shipping_prices[i],
+        'description': f'Popis dopravy {i}',
+        'active':      True,
+    } for i in range(1, shipping + 1)])
+
+    # objednávky a položky generujeme po dávkách, 1M objednávek se nevejde do paměti najednou
+    statuses = ['new', 'processing', 'shipped', 'delivered', 'cancelled']
+    now = datetime.utcnow()
+    item_id = 1
+    for start in range(1, orders + 1, CHUNK_SIZE):
+        order_rows, item_rows = [], []
+        for order_id in range(start, min(start + CHUNK_SIZE, orders + 1)):
+            subtotal, pieces = 0, 0
+            for _ in range(rng.randint(1, 5)):
+                product_id = rng.randint(1, products)
+                quantity = rng.randint(1, 3)
+                subtotal += product_prices[product_id] * quantity
+                pieces += quantity
+                item_rows.append({
+                    'id':            item_id,
+                    'order_id':      order_id,
+                    'product_id':    product_id,
+                    'quantity':      quantity,
+                    'price':         product_prices[product_id],
+                    'product_name':  f'Produkt {product_id}',
+                    'product_image': None,
+                    'line_total':    product_prices[product_id] * quantity,
+                })
+                item_id += 1
+            shipping_id = rng.randint(1, shipping)
+            total = subtotal + shipping_prices[shipping_id]
+            credits_used = rng.choice([0, 0, 0, min(total, rng.randint(1, 300))])
+            order_rows.append({
+                'id':               order_id,
+                'user_id':          rng.randint(1, users),
+                'shipping_id':      shipping_id,
+                'shipping_address': 'Benchmarková 1\n110 00 Praha',
+                'total_price':      total,
+                'credits_used':     credits_used,
+                'final_price':      total - credits_used,
+                'created_at':       now - timedelta(minutes=rng.randint(0, 60 * 24 * 730)),
+                'is_completed':     False,
+                'status':           rng.choice(statuses),
+                'note':             None,
+                'item_count':       pieces,
+                'shipping_name':    f'Doprava {shipping_id}',
+                'shipping_price':   shipping_prices[shipping_id],
+            })
+        _bulk_insert(Order, order_rows)
+        _bulk_insert(OrderItem, item_rows)
+
+    cart_users = rng.sample(range(1, users + 1), min(carts, users))
+    _bulk_insert(Cart, [{'id': i, 'user_id': uid} for i, uid in enumerate(cart_users, start=1)])
+
+    ctx = {
+        'admin_id':    1,
+        'cart_users':  cart_users,
+        'product_ids': list(range(1, products + 1)),
+        'order_count': orders,
+    }
+    reset_carts(ctx, seed)
+    return ctx
+
+
+def reset_carts(ctx, seed):
+    """Vrátí obsah košíků uživatelů do výchozího stavu daného seedem.
+
+    Volá se před každým scénářem: add_to_cart a checkout_confirm mění košíky
+    stejných uživatelů, bez resetu by počet dotazů košíku a checkoutu závisel
+    na pořadí scénářů a na --reuse-db.
+    """
+    from sqlalchemy import select
+    from models import db, Cart, CartItem
+
+    rng = random.Random(seed)
+    user_carts = select(Cart.id).where(Cart.user_id.isnot(None))
+    CartItem.query.filter(CartItem.cart_id.in_(user_carts)).delete(synchronize_session=False)
+    products = ctx['product_ids']
+    cart_items = []
+    for cart_id in db.session.execute(user_carts.order_by(Cart.id)).scalars():
+        for product_id in rng.sample(products, min(len(products), CART_ITEMS)):
+            cart_items.append({'cart_id': cart_id, 'product_id': product_id, 'quantity': rng.randint(1, 3)})
+    _bulk_insert(CartItem, cart_items)
+
+
+# ——— SCÉNÁŘE ———————————————————————————————————————————————————————————————
+
+def _login(client, user_id):
+    # obejdeme login formulář (CSRF, hashování hesla) – Flask-Login čte jen session
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+
+
+def _prepare_cart(client, ctx, rng):
+    client.post(f'/add_to_cart/{rng.choice(ctx["product_ids"])}', data={'quantity': 1})
+
+
+# název: (metoda, funkce vracející URL, přihlásit jako admin?, data formuláře, příprava)
+SCENARIOS = {
+    'index':          ('GET',  lambda ctx, rng: f'/?page={rng.randint(1, 3)}', False, None, None),
+    'product_detail': ('GET',  lambda ctx, rng: f'/product/{rng.choice(ctx["product_ids"])}', False, None, None),
+    'cart':           ('GET',  lambda ctx, rng: '/cart', False, None, None),
+    'add_to_cart':    ('POST', lambda ctx, rng: f'/add_to_cart/{rng.choice(ctx["product_ids"])}', False,
+                       {'quantity': 1}, None),
+    'checkout':       ('GET',  lambda ctx, rng: '/checkout', False, None, None),
+    'checkout_confirm': ('POST', lambda ctx, rng: '/checkout', False,
+                         {'confirm_order': '1', 'shipping_address': 'Benchmarková 1'}, _prepare_cart),
+    'orders':         ('GET',  lambda ctx, rng: '/orders', False, None, None),
+    'admin_orders':   ('GET',  lambda ctx, rng: f'/admin/orders?page={rng.randint(1, 5)}', True, None, None),
+    'admin_users':    ('GET',  lambda ctx, rng: '/admin/users', True, None, None),
+}
+
+
+def run_scenarios(ctx, names, requests, seed):
+    """Spustí scénáře v aktuálním procesu a vrátí naměřené hodnoty.
+
+    `started`/`finished` ohraničují jen měřenou smyčku (bez zahřátí); jde
+    o time.time(), aby se daly porovnat mezi procesy.
+    """
+    global _query_count
+    rng = random.Random(seed)
+    results = {}
+    for name in names:
+        method, url_for_ctx, as_admin, data, prepare = SCENARIOS[name]
+        client = _app.test_client()
+        _login(client, ctx['admin_id'] if as_admin else rng.choice(ctx['cart_users']))
+        # jeden request na zahřátí (create_all, kompilace šablon)
+        client.open(url_for_ctx(ctx, rng), method=method, data=data)
+
+        latencies, queries, errors = [], [], 0
+        loop_started = time.time()
+        for _ in range(requests):
+            if prepare:
+                prepare(client, ctx, rng)
+            url = url_for_ctx(ctx, rng)
+            _query_count = 0
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            latencies.append(time.perf_counter() - started)
+            queries.append(_query_count)
+            if response.status_code >= 400:
+                errors += 1
+        results[name] = {'latencies': latencies, 'queries': queries, 'errors': errors,
+                         'started': loop_started, 'finished': time.time()}
+    return results
+
+
+def _worker(args):
+    db_path, ctx, names, requests, seed = args
+    if _app is None:
+        setup_app(db_path)
+    from models import db
+    with _app.app_context():
+        # spojení zděděná přes fork nesmí sdílet víc procesů
+        db.engine.dispose()
+    return run_scenarios(ctx, names, requests, seed)
+
+
+# ——— VYHODNOCENÍ ————————————————————————————————————————————————————————————
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(raw, wall_time):
+    summary = {}
+    for name, data in raw.items():
+        latencies = sorted(data['latencies'])
+        count = len(latencies)
+        summary[name] = {
+            'requests': count,
+            'errors':   data['errors'],
+            'rps':      round(count / wall_time[name], 1) if wall_time[name] else 0.0,
+            'mean_ms':  round(sum(latencies) / count * 1000, 2) if count else 0.0,
+            'p50_ms':   round(_percentile(latencies, 50) * 1000, 2),
+            'p95_ms':   round(_percentile(latencies, 95) * 1000, 2),
+            'p99_ms':   round(_percentile(latencies, 99) * 1000, 2),
+            'queries':  round(sum(data['queries']) / count, 1) if count else 0.0,
+        }
+    return summary
+
+
+def compare(summary, baseline, tolerance):
+    """Vrátí seznam regresí proti baseline (latence, propustnost, dotazy)."""
+    regressions = []
+    for name, current in summary.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']} ms > baseline {base['p95_ms']} ms")
+        if current['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: propustnost {current['rps']} req/s < baseline {base['rps']} req/s")
+        # košíky se před každým scénářem resetují, počet dotazů je tedy
+        # deterministický a jakýkoli nárůst je N+1 regrese
+        if current['queries'] > base['queries']:
+            regressions.append(f"{name}: {current['queries']} dotazů/request > baseline {base['queries']}")
+    return regressions
+
+
+def print_summary(summary):
+    header = f"{'scénář':<18}{'req':>7}{'chyby':>7}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'dotazy':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, s in summary.items():
+        print(f"{name:<18}{s['requests']:>7}{s['errors']:>7}{s['rps']:>10}{s['p50_ms']:>10}"
+              f"{s['p95_ms']:>10}{s['p99_ms']:>10}{s['queries']:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Výkonnostní benchmark e-shopu')
+    parser.add_argument('--orders', type=int, default=1000, help='počet objednávek (1k – 1M)')
+    parser.add_argument('--users', type=int, default=None, help='počet uživatelů (výchozí orders/10)')
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--shipping', type=int, default=4)
+    parser.add_argument('--carts', type=int, default=None, help='počet košíků (výchozí users/5)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=100, help='počet měřených requestů na scénář a proces')
+    parser.add_argument('--processes', type=int, default=1, help='počet paralelních procesů (zátěžový režim)')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='jen vybrané scénáře')
+    parser.add_argument('--db', default=None, help='cesta k benchmarkové DB (výchozí dočasný soubor)')
+    parser.add_argument('--reuse-db', action='store_true', help='nepřegenerovávat existující DB')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help='uložit výsledek jako nový baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='povolené zhoršení latence/propustnosti')
+    parser.add_argument('--output', default=None, help='uložit výsledky jako JSON')
+    args = parser.parse_args(argv)
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='eshop-bench-'), 'benchmark.db')
+    archive_path = os.path.splitext(db_path)[0] + '_archive.db'
+    if os.path.exists(db_path) and not args.reuse_db:
+        os.remove(db_path)
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+    generate = not os.path.exists(db_path)
+
+    app = setup_app(db_path)
+    with app.app_context():
+        if generate:
+            started = time.perf_counter()
+            ctx = generate_data(args.orders, args.users, args.products, args.shipping, args.carts, args.seed)
+            print(f'Vygenerováno {args.orders} objednávek za {time.perf_counter() - started:.1f} s ({db_path})')
+        else:
+            from models import User, Product, Cart, Order
+            ctx = {
+                'admin_id':    User.query.filter_by(is_admin=True).first().id,
+                'cart_users':  [c.user_id for c in Cart.query.filter(Cart.user_id.isnot(None)).order_by(Cart.id)],
+                'product_ids': [p.id for p in Product.query.with_entities(Product.id).order_by(Product.id)],
+                'order_count': Order.query.count(),
+            }
+
+    names = args.scenario or list(SCENARIOS)
+    raw, wall_time = {}, {}
+    if args.processes > 1:
+        # každý scénář zvlášť, ať je propustnost měřena pod souběžnou zátěží jednoho typu
+        mp = multiprocessing.get_context('fork')
+        with mp.Pool(args.processes) as pool:
+            for name in names:
+                with app.app_context():
+                    reset_carts(ctx, args.seed)
+                jobs = [(db_path, ctx, [name], args.requests, args.seed + i) for i in range(args.processes)]
+                parts = pool.map(_worker, jobs)
+                # od začátku první měřené smyčky do konce poslední – bez forku, importu a zahřátí
+                wall_time[name] = max(p[name]['finished'] for p in parts) - min(p[name]['started'] for p in parts)
+                raw[name] = {
+                    'latencies': [v for p in parts for v in p[name]['latencies']],
+                    'queries':   [v for p in parts for v in p[name]['queries']],
+                    'errors':    sum(p[name]['errors'] for p in parts),
+                }
+    else:
+        for name in names:
+            with app.app_context():
+                reset_carts(ctx, args.seed)
+            raw.update(run_scenarios(ctx, [name], args.requests, args.seed))
+            wall_time[name] = raw[name]['finished'] - raw[name]['started']
+
+    summary = summarize(raw, wall_time)
+    print_summary(summary)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f'Baseline uložen do {args.baseline}')
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.tolerance)
+        if regressions:
+            print('\nREGRESE:')
+            for line in regressions:
+                print('  ' + line)
+            return 1
+        print('\nBez regresí proti baseline.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,14 @@
+"""Přepočet doporučení: python build_recommendations.py [--full]
+
+Bez --full přičte jen objednávky od posledního běhu (jinak běží přes cron.yaml).
+"""
+import sys
+
+from app import app, db
+from db_upgrade import add_missing_columns
+from recommendations import refresh
+
+with app.app_context():
+    db.create_all()
+    add_missing_columns()
+    print(f'Zpracováno položek objednávek: {refresh(full="--full" in sys.argv)}')
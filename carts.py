@@ -0,0 +1,132 @@
+"""Košíky: košík hosta v cookie, sloučení po přihlášení a úklid starých košíků.
+
+Nepřihlášený návštěvník nemá v DB žádný řádek. Jeho košík je v podepsané
+session cookie jako kompaktní řetězec `id:množství,id:množství`. Po
+přihlášení se jedním dávkovým zápisem sloučí do uživatelova košíku v DB.
+
+sweep_carts() maže po dávkách košíky hostů ze staré verze (user_id NULL),
+prázdné košíky a košíky, na které nikdo nesáhl déle než zadaný počet dní.
+"""
+from datetime import datetime, timedelta
+
+from flask import session
+from sqlalchemy import insert
+
+from models import db, Cart, CartItem, Product
+
+SESSION_KEY = 'guest_cart'
+MAX_GUEST_ITEMS = 50   # cookie má limit ~4 kB
+EMPTY_CART_GRACE = timedelta(hours=1)   # právě založený košík ještě nemusí mít položky
+
+
+class GuestCartItem:
+    """Položka košíku hosta se stejným rozhraním jako CartItem pro šablony."""
+
+    def __init__(self, product, quantity):
+        self.id         = product.id     # v košíku hosta identifikuje položku produkt
+        self.product_id = product.id
+        self.product    = product
+        self.quantity   = quantity
+
+
+# ——— KOŠÍK HOSTA ———————————————————————————————————————————————————————————
+
+def load_guest_cart():
+    """{product_id: množství} ze session."""
+    raw = session.get(SESSION_KEY, '')
+    cart = {}
+    for part in raw.split(','):
+        product_id, _, quantity = part.partition(':')
+        if product_id.isdigit() and quantity.isdigit() and int(quantity) > 0:
+            cart[int(product_id)] = int(quantity)
+    return cart
+
+
+def save_guest_cart(cart):
+    if cart:
+        session[SESSION_KEY] = ','.join(f'{pid}:{qty}' for pid, qty in cart.items() if qty > 0)
+    else:
+        session.pop(SESSION_KEY, None)
+
+
+def add_to_guest_cart(product_id, quantity):
+    cart = load_guest_cart()
+    if product_id not in cart and len(cart) >= MAX_GUEST_ITEMS:
+        return False
+    cart[product_id] = cart.get(product_id, 0) + quantity
+    save_guest_cart(cart)
+    return True
+
+
+def guest_cart_items():
+    """Položky košíku hosta s produkty načtenými jedním dotazem."""
+    cart = load_guest_cart()
+    if not cart:
+        return []
+    products = Product.query.filter(Product.id.in_(cart)).all()
+    return [GuestCartItem(p, cart[p.id]) for p in products]
+
+
+def merge_guest_cart(user):
+    """Přesune košík hosta do košíku uživatele (jeden SELECT, jeden UPDATE, jeden INSERT)."""
+    guest = load_guest_cart()
+    if not guest:
+        return
+    # smazané nebo neexistující produkty z cookie vynecháme
+    valid = {pid for (pid,) in db.session.query(Product.id).filter(Product.id.in_(guest))}
+    guest = {pid: qty for pid, qty in guest.items() if pid in valid}
+
+    cart = Cart.query.filter_by(user_id=user.id).first()
+    if not cart:
+        cart = Cart(user_id=user.id)
+        db.session.add(cart)
+        db.session.flush()
+    cart.updated_at = datetime.utcnow()
+
+    existing = CartItem.query.filter(CartItem.cart_id == cart.id, CartItem.product_id.in_(guest)).all()
+    for item in existing:
+        # v DB může být jeden produkt ve dvou řádcích – množství přičteme jen k prvnímu
+        item.quantity += guest.pop(item.product_id, 0)
+    if guest:
+        db.session.execute(insert(CartItem), [
+            {'cart_id': cart.id, 'product_id': pid, 'quantity': qty} for pid, qty in guest.items()
+        ])
+    db.session.commit()
+    session.pop(SESSION_KEY, None)
+
+
+# ——— ÚKLID ———————————————————————————————————————————————————————————————————
+
+def _delete_batches(conditions, batch_size, max_batches):
+    deleted = 0
+    cart_exists = db.session.query(Cart.id).filter(Cart.id == CartItem.cart_id).exists()
+    for _ in range(max_batches):
+        ids = [cart_id for (cart_id,) in db.session.query(Cart.id).filter(*conditions).limit(batch_size)]
+        if not ids:
+            break
+        # podmínku ověříme znovu přímo v DELETE – mezi výběrem a smazáním mohl
+        # jiný worker do košíku přidat zboží (a posunout updated_at)
+        deleted += Cart.query.filter(Cart.id.in_(ids), *conditions).delete(synchronize_session=False)
+        # položky jen u košíků, které se opravdu smazaly
+        CartItem.query.filter(CartItem.cart_id.in_(ids), ~cart_exists).delete(synchronize_session=False)
+        # commit po každé dávce – SQLite drží zámek zápisu jen krátce
+        db.session.commit()
+    return deleted
+
+
+def sweep_carts(abandoned_days=30, batch_size=500, max_batches=100):
+    """Smaže staré košíky po dávkách; vrací počty smazaných podle důvodu."""
+    # košíky bez časové značky (z doby před sloupcem updated_at) začnou stárnout teď
+    Cart.query.filter(Cart.updated_at.is_(None)).update({'updated_at': datetime.utcnow()},
+                                                          synchronize_session=False)
+    db.session.commit()
+
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=abandoned_days)
+    has_items = db.session.query(CartItem.id).filter(CartItem.cart_id == Cart.id).exists()
+    return {
+        'guest':     _delete_batches([Cart.user_id.is_(None)], batch_size, max_batches),
+        'empty':     _delete_batches([~has_items, Cart.updated_at < now - EMPTY_CART_GRACE],
+                                     batch_size, max_batches),
+        'abandoned': _delete_batches([Cart.updated_at < cutoff], batch_size, max_batches),
+    }
@@ -1,8 +1,14 @@
 import os
+import tempfile
 
 class Config:
     SECRET_KEY = 'tajny-klic-pro-zabezpeceni-aplikace'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///eshop.db'
+    # DATABASE_URL umožní spustit aplikaci nad jinou DB (benchmark, testovací data)
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///eshop.db')
+    # archiv starých objednávek v samostatném souboru (archive.py)
+    SQLALCHEMY_BINDS = {
+        'archive': os.environ.get('ARCHIVE_DATABASE_URL', 'sqlite:///eshop_archive.db'),
+    }
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'static/uploads')
     MAIL_SERVER = 'smtp.gmail.com'  # Nastavte podle vašeho poskytovatele e-mailu
@@ -10,4 +16,39 @@ class Config:
     MAIL_USE_TLS = True
     MAIL_USERNAME = 'vas-email@gmail.com'  # Změňte na váš e-mail
     MAIL_PASSWORD = 'vase-heslo'  # Změňte na vaše heslo
-    MAIL_DEFAULT_SENDER = 'vas-email@gmail.com'  # Změňte na váš e-mail
\ No newline at end of file
+    MAIL_DEFAULT_SENDER = 'vas-email@gmail.com'  # Změňte na váš e-mail
+
+    # Vzorkovací profiler (profiling.py) – ve výchozím stavu vypnutý
+    PROFILING_ENABLED        = os.environ.get('PROFILING_ENABLED') == '1'
+    PROFILING_SAMPLE_RATE    = 0.01   # podíl profilovaných requestů
+    PROFILING_ENDPOINT_RATES = {}     # např. {'checkout': 0.2}
+    PROFILING_INTERVAL       = 0.005  # s mezi vzorky
+    PROFILING_HEADER         = 'X-Profile'  # vynutí profilování (jen admin)
+
+    # Úklid košíků (carts.sweep_carts) – po kolika dnech bez změny je košík opuštěný
+    CART_ABANDONED_DAYS = 30
+
+    # Archivace – doručené/zrušené objednávky starší než tolik dní jdou do archivu
+    ARCHIVE_AFTER_DAYS = 365
+
+    # Doporučení „zákazníci také koupili" (recommendations.py)
+    RECOMMENDATIONS_TOP_K = 8
+
+    # JSON API katalogu (api.py)
+    API_PAGE_SIZE     = 50
+    API_MAX_PAGE_SIZE = 200
+    API_CACHE_MAX_AGE = 60   # s, Cache-Control pro klienty a proxy
+
+    # Předkompilované šablony (template_cache.py, precompile_templates.py); prázdná hodnota cache vypne
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get(
+        'JINJA_BYTECODE_CACHE_DIR',
+        os.path.join(os.path.abspath(os.path.dirname(__file__)), 'jinja_cache'),
+    )
+
+    # Metriky (metrics.py); soubory workerů slučuje gunicorn master (gunicorn.conf.py).
+    # Výchozí adresář je v /tmp – na App Engine je jinde souborový systém jen pro čtení
+    METRICS_DIR   = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'eshop-metrics'))
+    # Sdílené verze cache nastavení a dopravy (shared_version.py), musí být zapisovatelné
+    VERSIONS_DIR  = os.environ.get('VERSIONS_DIR', os.path.join(tempfile.gettempdir(), 'eshop-versions'))
+    # token pro Prometheus (Authorization: Bearer …); bez něj /metrics vidí jen admin
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
\ No newline at end of file
@@ -0,0 +1,241 @@
+"""Změny kreditů přes append-only ledger a snapshoty zůstatků.
+
+Každá změna User.credits se provede jako množinové SQL v jedné transakci:
+nejdřív INSERT ... SELECT do credit_ledger (jeden řádek na uživatele, delta
+spočítaná v SQL z aktuálního zůstatku), pak jeden UPDATE user, který přičte
+delty dané dávky. Nic se nečte do Pythonu a znovu nezapisuje, souběžný
+checkout tak o změnu nepřijde (SQLite drží zámek zápisu od prvního příkazu
+do commitu). Commit dělá volající.
+
+Zůstatek se dá odvodit jako součet delt. snapshot_balances() pravidelně
+ukládá zůstatky do credit_snapshot, history() pak čte jen poslední snapshot
+a záznamy po něm (index user_id + id).
+
+Ledger nemá cizí klíč na user, historie zůstává i po smazání účtu; tabulka
+user je proto AUTOINCREMENT (ensure_monotonic_user_ids) a nový účet ID
+smazaného nedostane.
+"""
+import csv
+import io
+import uuid
+from datetime import datetime
+
+from sqlalchemy import and_, bindparam, case, func, insert, literal, select, true, update
+
+from db_upgrade import ensure_autoincrement
+from models import db, User, CreditLedger, CreditSnapshot
+
+LEDGER_COLUMNS = ['user_id', 'delta', 'reason', 'batch_id', 'created_by', 'note', 'created_at']
+
+
+class CreditError(ValueError):
+    """Neplatná hromadná operace (CSV, částka) – nic se nezapsalo."""
+
+
+def _delta(mode, amount):
+    """SQL výraz delty pro jednoho uživatele; zůstatek nikdy neklesne pod nulu."""
+    balance = func.coalesce(User.credits, 0)
+    if mode == 'set':
+        return amount - balance
+    if mode == 'subtract':
+        amount = -amount
+    return case((balance + amount < 0, -balance), else_=amount)
+
+
+def _ledger_select(delta, reason, batch_id, created_by, note):
+    return select(
+        User.id, delta, literal(reason), literal(batch_id), literal(created_by),
+        literal(note), literal(datetime.utcnow()),
+    )
+
+
+def _apply_batch(batch_id):
+    """Přičte delty dávky k User.credits jedním UPDATE."""
+    batch = select(CreditLedger.user_id).where(CreditLedger.batch_id == batch_id)
+    total = select(func.sum(CreditLedger.delta))\
+        .where(CreditLedger.batch_id == batch_id, CreditLedger.user_id == User.id)\
+        .scalar_subquery()
+    db.session.execute(
+        update(User).where(User.id.in_(batch)).values(credits=func.coalesce(User.credits, 0) + total),
+        execution_options={'synchronize_session': False},
+    )
+
+
+def user_filter(email_contains='', include_admins=False):
+    """Podmínka pro hromadnou operaci nad částí uživatelů."""
+    conditions = []
+    if email_contains:
+        conditions.append(User.email.contains(email_contains))
+    if not include_admins:
+        conditions.append(User.is_admin.isnot(True))
+    return and_(true(), *conditions)
+
+
+def adjust(mode, amount, where=None, reason='bulk', created_by=None, note=None):
+    """Přidá / odebere / nastaví kredity všem uživatelům splňujícím `where`.
+
+    Vrací počet uživatelů, kterým se zůstatek změnil.
+    """
+    if mode not in ('add', 'subtract', 'set'):
+        raise CreditError('Neznámá akce')
+    if amount < 0:
+        raise CreditError('Částka nesmí být záporná')
+    batch_id = uuid.uuid4().hex
+    delta = _delta(mode, amount)
+    query = _ledger_select(delta, reason, batch_id, created_by, note).where(delta != 0)
+    if where is not None:
+        query = query.where(where)
+    result = db.session.execute(insert(CreditLedger).from_select(LEDGER_COLUMNS, query))
+    _apply_batch(batch_id)
+    return result.rowcount
+
+
+def parse_csv(text):
+    """CSV `email,částka` (částka se znaménkem) -> {email: součet}; hlavička je volitelná."""
+    amounts, errors = {}, []
+    for line_no, row in enumerate(csv.reader(io.StringIO(text)), start=1):
+        if not row or not ''.join(row).strip():
+            continue
+        if len(row) < 2:
+            errors.append(f'řádek {line_no}: chybí částka')
+            continue
+        email, raw = row[0].strip().lower(), row[1].strip()
+        try:
+            amount = int(raw)
+        except ValueError:
+            if line_no == 1:
+                continue   # hlavička
+            errors.append(f'řádek {line_no}: neplatná částka „{raw}"')
+            continue
+        amounts[email] = amounts.get(email, 0) + amount
+    if errors:
+        raise CreditError('; '.join(errors[:5]))
+    return amounts
+
+
+def adjust_from_csv(text, created_by=None, note=None):
+    """Připíše (nebo odebere) částky z CSV; neznámé e-maily operaci zruší."""
+    amounts = parse_csv(text)
+    if not amounts:
+        raise CreditError('CSV neobsahuje žádné řádky')
+    emails = list(amounts)
+    known = set()
+    for start in range(0, len(emails), 500):
+        known.update(db.session.execute(
+            select(func.lower(User.email)).where(func.lower(User.email).in_(emails[start:start + 500]))
+        ).scalars())
+    unknown = [e for e in emails if e not in known]
+    if unknown:
+        raise CreditError(f'Neznámé e-maily: {", ".join(unknown[:5])}' + (' …' if len(unknown) > 5 else ''))
+
+    batch_id = uuid.uuid4().hex
+    amount = bindparam('amount')
+    delta = _delta('add', amount)
+    query = _ledger_select(delta, 'csv', batch_id, created_by, note)\
+        .where(func.lower(User.email) == bindparam('email'), delta != 0)
+    # jeden příkaz, executemany přes všechny řádky CSV
+    db.session.connection().execute(
+        insert(CreditLedger).from_select(LEDGER_COLUMNS, query),
+        [{'email': e, 'amount': a} for e, a in amounts.items()],
+    )
+    _apply_batch(batch_id)
+    return len(amounts)
+
+
+def spend(user_id, amount, order_id):
+    """Odečte kredity při checkoutu; False, pokud jich uživatel už tolik nemá."""
+    if amount <= 0:
+        return True
+    result = db.session.execute(
+        update(User).where(User.id == user_id, User.credits >= amount)
+        .values(credits=User.credits - amount)
+    )
+    if result.rowcount != 1:
+        return False
+    db.session.execute(insert(CreditLedger).values(
+        user_id=user_id, delta=-amount, reason='checkout', order_id=order_id,
+        created_by=user_id, created_at=datetime.utcnow(),
+    ))
+    return True
+
+
+def ensure_opening_balances():
+    """Zůstatky z doby před ledgerem zapíše jako počáteční záznamy (jen jednou)."""
+    has_entries = select(CreditLedger.id).where(CreditLedger.user_id == User.id).exists()
+    query = _ledger_select(User.credits, 'opening', None, None, None)\
+        .where(func.coalesce(User.credits, 0) != 0, ~has_entries)
+    result = db.session.execute(insert(CreditLedger).from_select(LEDGER_COLUMNS, query))
+    db.session.commit()
+    return result.rowcount
+
+
+def ensure_monotonic_user_ids():
+    """ID smazaného uživatele s historií v ledgeru se nesmí přidělit novému účtu."""
+    high_water = db.session.execute(select(func.max(CreditLedger.user_id))).scalar() or 0
+    db.session.commit()
+    ensure_autoincrement(User, high_water)
+
+
+# ——— SNAPSHOTY A HISTORIE ——————————————————————————————————————————————————————
+
+def _latest_snapshots():
+    latest = select(CreditSnapshot.user_id, func.max(CreditSnapshot.ledger_id).label('ledger_id'))\
+        .group_by(CreditSnapshot.user_id).subquery()
+    return select(CreditSnapshot.user_id, CreditSnapshot.ledger_id, CreditSnapshot.balance)\
+        .join(latest, and_(CreditSnapshot.user_id == latest.c.user_id,
+                           CreditSnapshot.ledger_id == latest.c.ledger_id))\
+        .subquery()
+
+
+def snapshot_balances():
+    """Uloží nový snapshot pro uživatele se záznamy od posledního snapshotu; vrací jejich počet."""
+    upto = db.session.execute(select(func.max(CreditLedger.id))).scalar()
+    if upto is None:
+        return 0
+    last = _latest_snapshots()
+    query = select(
+        CreditLedger.user_id,
+        func.max(CreditLedger.id),
+        func.coalesce(func.max(last.c.balance), 0) + func.sum(CreditLedger.delta),
+        literal(datetime.utcnow()),
+    ).outerjoin(last, last.c.user_id == CreditLedger.user_id)\
+     .where(CreditLedger.id > func.coalesce(last.c.ledger_id, 0), CreditLedger.id <= upto)\
+     .group_by(CreditLedger.user_id)
+    result = db.session.execute(insert(CreditSnapshot).from_select(
+        ['user_id', 'ledger_id', 'balance', 'created_at'], query))
+    db.session.commit()
+    return result.rowcount
+
+
+def mismatched_balances():
+    """Uživatelé, jejichž User.credits nesedí se součtem ledgeru: [(id, credits, ledger)]."""
+    total = func.coalesce(func.sum(CreditLedger.delta), 0)
+    return db.session.execute(
+        select(User.id, func.coalesce(User.credits, 0), total)
+        .outerjoin(CreditLedger, CreditLedger.user_id == User.id)
+        .group_by(User.id)
+        .having(func.coalesce(User.credits, 0) != total)
+    ).all()
+
+
+def history(user_id, limit=50):
+    """Zůstatek odvozený z ledgeru a posledních `limit` záznamů se zůstatkem po změně.
+
+    Čte jen poslední snapshot a záznamy od něj, celý ledger se neprochází.
+    """
+    snapshot = CreditSnapshot.query.filter_by(user_id=user_id)\
+        .order_by(CreditSnapshot.ledger_id.desc()).first()
+    base, since = (snapshot.balance, snapshot.ledger_id) if snapshot else (0, 0)
+    pending = db.session.execute(
+        select(func.coalesce(func.sum(CreditLedger.delta), 0))
+        .where(CreditLedger.user_id == user_id, CreditLedger.id > since)
+    ).scalar()
+    balance = base + pending
+
+    entries = CreditLedger.query.filter_by(user_id=user_id)\
+        .order_by(CreditLedger.id.desc()).limit(limit).all()
+    running = balance
+    for entry in entries:
+        entry.balance_after = running
+        running -= entry.delta
+    return balance, entries, snapshot
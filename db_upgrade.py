@@ -0,0 +1,152 @@
+"""Úpravy schématu existující databáze.
+
+db.create_all() vytvoří jen chybějící tabulky, ke starým tabulkám sloupce
+nepřidá. add_missing_columns() porovná modely se schématem v DB a chybějící
+(nullable) sloupce doplní přes ALTER TABLE ADD COLUMN. Volá ji první request
+každého workeru, takže sloupec mezitím mohl přidat jiný worker – to se
+nepovažuje za chybu.
+
+ensure_autoincrement() přestaví starou SQLite tabulku na AUTOINCREMENT, aby
+se ID smazaných (archivovaných) řádků nikdy nepřidělila znovu. I ta běží
+v prvním requestu každého workeru; přestavbu, kterou mezitím dokončil jiný
+worker, zopakuje jen jako úpravu sqlite_sequence.
+
+backfill_order_snapshots() doplní do starých objednávek snapshot produktů a
+dopravy (sloupce přidané add_missing_columns) po dávkách podle ID. Jde jen
+o historické sloupce objednávky – dnešní ceny dopravy se nepoužijí.
+"""
+from sqlalchemy import MetaData, func, inspect, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateTable
+
+from models import db, Order, OrderItem
+
+BACKFILL_BATCH_SIZE = 5000
+
+_ITEMS_BACKFILL = text('''
+    UPDATE order_item SET
+        product_name  = COALESCE((SELECT name FROM product WHERE product.id = order_item.product_id),
+                                 'Smazaný produkt #' || order_item.product_id),
+        product_image = (SELECT image_filename FROM product WHERE product.id = order_item.product_id),
+        line_total    = price * quantity
+    WHERE id BETWEEN :start AND :end AND product_name IS NULL
+''')
+
+# doprava = celková cena − součet položek; dnešní Shipping.price může být jiná
+_ORDERS_BACKFILL = text('''
+    UPDATE "order" SET
+        item_count     = (SELECT COALESCE(SUM(quantity), 0) FROM order_item WHERE order_item.order_id = "order".id),
+        shipping_name  = COALESCE((SELECT name FROM shipping WHERE shipping.id = "order".shipping_id), '–'),
+        shipping_price = MAX(total_price - (SELECT COALESCE(SUM(price * quantity), 0) FROM order_item
+                                            WHERE order_item.order_id = "order".id), 0)
+    WHERE id BETWEEN :start AND :end AND shipping_name IS NULL
+''')
+
+
+def add_missing_columns(engine=None):
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            col_type = column.type.compile(dialect=engine.dialect)
+            # každý ALTER zvlášť – souběžný worker mohl sloupec právě přidat
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}'))
+            except OperationalError:
+                if column.name not in {c['name'] for c in inspect(engine).get_columns(table.name)}:
+                    raise
+                continue
+            added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def ensure_autoincrement(model, min_id=0, engine=None):
+    """Zajistí rostoucí ID tabulky modelu: další přidělené ID bude větší než min_id.
+
+    Bez AUTOINCREMENT dává SQLite nový řádek za nejvyšší existující ID, takže
+    po smazání nejnovějších řádků se jejich ID použijí znovu. Tabulka bez
+    AUTOINCREMENT se přestaví (nová tabulka, kopie dat, přejmenování) a
+    sqlite_sequence se nastaví aspoň na min_id.
+    """
+    engine = engine or db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    table = model.__table__
+    for attempt in range(2):
+        try:
+            with engine.begin() as conn:
+                _ensure_autoincrement(conn, table, min_id)
+            return
+        except OperationalError:
+            # souběžný worker tabulku právě přestavěl – podruhé už jen sqlite_sequence
+            with engine.connect() as conn:
+                rebuilt = 'AUTOINCREMENT' in (_table_sql(conn, table.name) or '').upper()
+            if attempt or not rebuilt:
+                raise
+
+
+def _table_sql(conn, name):
+    return conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                        {'name': name}).scalar()
+
+
+def _ensure_autoincrement(conn, table, min_id):
+    sql = _table_sql(conn, table.name)
+    if sql is None:
+        return
+    if 'AUTOINCREMENT' not in sql.upper():
+        existing = {c['name'] for c in inspect(conn).get_columns(table.name)}
+        columns = ', '.join(f'"{c.name}"' for c in table.columns if c.name in existing)
+        # kopie ostatních tabulek, aby šly přeložit cizí klíče nové tabulky
+        metadata = MetaData()
+        for other in db.metadata.tables.values():
+            if other is not table:
+                other.to_metadata(metadata)
+        new = table.to_metadata(metadata, name=f'{table.name}__new')
+        conn.execute(CreateTable(new))
+        conn.execute(text(f'INSERT INTO "{new.name}" ({columns}) SELECT {columns} FROM "{table.name}"'))
+        conn.execute(text(f'DROP TABLE "{table.name}"'))
+        conn.execute(text(f'ALTER TABLE "{new.name}" RENAME TO "{table.name}"'))
+        for index in table.indexes:
+            index.create(conn)
+
+    top = max(min_id, conn.execute(text(f'SELECT COALESCE(MAX(id), 0) FROM "{table.name}"')).scalar())
+    seq = conn.execute(text('SELECT seq FROM sqlite_sequence WHERE name = :name'),
+                       {'name': table.name}).scalar()
+    if seq is None:
+        conn.execute(text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'),
+                     {'name': table.name, 'seq': top})
+    elif seq < top:
+        conn.execute(text('UPDATE sqlite_sequence SET seq = :seq WHERE name = :name'),
+                     {'name': table.name, 'seq': top})
+
+
+
+def backfill_order_snapshots(batch_size=BACKFILL_BATCH_SIZE):
+    """Doplní snapshot do objednávek a položek bez něj; vrací (položek, objednávek)."""
+    return (_backfill(_ITEMS_BACKFILL, OrderItem, OrderItem.product_name, batch_size),
+            _backfill(_ORDERS_BACKFILL, Order, Order.shipping_name, batch_size))
+
+
+def _backfill(statement, model, snapshot_column, batch_size):
+    # jeden průchod najde rozsah nedoplněných řádků; nové objednávky snapshot mají vždy
+    low, high = db.session.execute(
+        select(func.min(model.id), func.max(model.id)).where(snapshot_column.is_(None))
+    ).one()
+    updated = 0
+    if low is None:
+        db.session.commit()
+        return updated
+    for start in range(low, high + 1, batch_size):
+        result = db.session.execute(statement, {'start': start, 'end': start + batch_size - 1})
+        db.session.commit()
+        updated += result.rowcount
+    return updated
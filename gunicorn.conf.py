@@ -0,0 +1,22 @@
+"""Konfigurace gunicornu (app.yaml: gunicorn -c gunicorn.conf.py ...)."""
+
+
+def post_worker_init(worker):
+    # šablony se načtou z bytecode cache dřív, než worker přijme první request
+    from template_cache import warm_up
+    loaded, errors = warm_up(worker.wsgi)
+    worker.log.info('Načteno šablon: %d (chyb: %d)', loaded, len(errors))
+
+
+def on_starting(server):
+    # metriky workerů z minulého běhu přičte do součtu ukončených
+    import metrics
+    from config import Config
+    metrics.fold(Config.METRICS_DIR)
+
+
+def child_exit(server, worker):
+    # soubor ukončeného workeru se přičte k ostatním a smaže (PID se může opakovat)
+    import metrics
+    from config import Config
+    metrics.fold(Config.METRICS_DIR, worker.pid)
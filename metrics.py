@@ -0,0 +1,324 @@
+"""Metriky běhu aplikace ve formátu Prometheus.
+
+Každý proces (gunicorn worker) drží čítače a histogramy v paměti a nejvýše
+jednou za METRICS_FLUSH_INTERVAL je zapíše do vlastního souboru
+`METRICS_DIR/metrics.<pid>.<token>.json` (token odliší proces se znovu
+použitým PID). Endpoint /metrics při čtení sečte soubory všech workerů.
+Mezi procesy se tedy nic nezamyká a v procesu drží zámek jen po dobu
+přičtení jednoho čísla. Když do METRICS_DIR nelze zapisovat, /metrics
+ukazuje jen hodnoty procesu, který request obsloužil.
+
+Soubory ukončených workerů přičte gunicorn master (gunicorn.conf.py,
+child_exit a on_starting) funkcí fold() do `metrics.exited.json` a smaže je,
+takže adresář neroste a čítače neklesají.
+
+/metrics vidí jen admin nebo klient s hlavičkou
+`Authorization: Bearer <METRICS_TOKEN>` (Prometheus).
+
+Záznam:
+    metrics.inc('cart_add_total')
+    metrics.observe('image_processing_seconds', 0.12, operation='upload')
+    with metrics.timer('image_processing_seconds', operation='upload'):
+        ...
+"""
+import atexit
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy.pool import QueuePool
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# název: (popis, hranice bucketů)
+HISTOGRAMS = {
+    'http_request_duration_seconds':  ('Doba zpracování requestu', DEFAULT_BUCKETS),
+    'db_pool_checkout_wait_seconds':  ('Čekání na spojení z DB poolu',
+                                       (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)),
+    'image_processing_seconds':       ('Zpracování nahraného obrázku', DEFAULT_BUCKETS),
+    'template_render_seconds':        ('Vykreslení šablony podle šablony a endpointu',
+                                       (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)),
+}
+
+# název: popis
+COUNTERS = {
+    'http_requests_total':         'Počet requestů podle endpointu, metody a stavového kódu',
+    'cart_add_total':              'Počet přidání produktu do košíku',
+    'cart_add_items_total':        'Počet kusů přidaných do košíku',
+    'checkout_orders_total':       'Počet dokončených objednávek',
+    'checkout_revenue_czk_total':  'Tržba z dokončených objednávek po odečtení kreditů (Kč)',
+    'checkout_credits_used_total': 'Kredity uplatněné v dokončených objednávkách',
+}
+
+# (název, labely) -> hodnota
+_counters = {}
+# (název, labely) -> [počty v bucketech..., +Inf, součet, počet]
+_histograms = {}
+_lock = threading.Lock()
+_folder = None
+_flush_interval = 1.0
+_next_flush = 0.0
+_process = None  # (pid, token) – po forku se token vygeneruje znovu
+
+EXITED_FILE = 'metrics.exited.json'
+
+
+def init_app(app):
+    """Zaregistruje měření requestů; volat před db.init_app (nastavuje pool)."""
+    global _folder, _flush_interval
+    app.config.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'eshop-metrics'))
+    app.config.setdefault('METRICS_FLUSH_INTERVAL', 1.0)
+    app.config.setdefault('METRICS_TOKEN', '')
+    _folder = app.config['METRICS_DIR']
+    _flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+    try:
+        os.makedirs(_folder, exist_ok=True)
+    except OSError:
+        # souborový systém jen pro čtení – metriky zůstanou v paměti procesu
+        app.logger.warning('METRICS_DIR %s není zapisovatelný, metriky se neukládají', _folder)
+        _folder = None
+
+    engine_options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    engine_options.setdefault('poolclass', TimedQueuePool)
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        _record(response.status_code)
+        g._metrics_recorded = True
+        return response
+
+    @app.teardown_request
+    def _record_exception(exc):
+        if exc is not None and not g.get('_metrics_recorded'):
+            _record(500)
+        maybe_flush()
+
+    atexit.register(flush)
+
+
+def authorized(token):
+    """Token z hlavičky Authorization: Bearer … (porovnání v konstantním čase)."""
+    header = request.headers.get('Authorization', '')
+    return bool(token) and header.startswith('Bearer ') \
+        and hmac.compare_digest(header[len('Bearer '):].encode(), token.encode())
+
+
+def _record(status):
+    started = g.get('_metrics_started')
+    endpoint = request.endpoint or 'unknown'
+    if started is not None:
+        observe('http_request_duration_seconds', time.perf_counter() - started, endpoint=endpoint)
+    inc('http_requests_total', endpoint=endpoint, method=request.method, status=status)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool, který měří, jak dlouho request čeká na volné spojení."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            observe('db_pool_checkout_wait_seconds', time.perf_counter() - started)
+
+
+# ——— ZÁZNAM ————————————————————————————————————————————————————————————————
+
+def _labels(labels):
+    return ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in sorted(labels.items())
+    )
+
+
+def inc(name, value=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    buckets = HISTOGRAMS[name][1]
+    key = (name, _labels(labels))
+    index = len(buckets)
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            index = i
+            break
+    with _lock:
+        data = _histograms.get(key)
+        if data is None:
+            data = _histograms[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+        data[index] += 1
+        data[-2] += value
+        data[-1] += 1
+
+
+@contextmanager
+def timer(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+# ——— SDÍLENÍ MEZI WORKERY ————————————————————————————————————————————————————
+
+def maybe_flush():
+    global _next_flush
+    now = time.monotonic()
+    if now >= _next_flush:
+        _next_flush = now + _flush_interval
+        flush()
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'counters':   [[n, l, v] for (n, l), v in _counters.items()],
+            'histograms': [[n, l, list(d)] for (n, l), d in _histograms.items()],
+        }
+
+
+def flush():
+    if _folder is None:
+        return
+    try:
+        _write(os.path.join(_folder, _file_name()), _snapshot())
+    except OSError:
+        pass   # zkusí se při dalším flush
+
+
+def _file_name():
+    global _process
+    pid = os.getpid()
+    if _process is None or _process[0] != pid:
+        _process = (pid, uuid.uuid4().hex[:8])
+    return f'metrics.{pid}.{_process[1]}.json'
+
+
+def _write(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(counters, histograms, data):
+    for n, l, v in data['counters']:
+        counters[(n, l)] = counters.get((n, l), 0) + v
+    for n, l, d in data['histograms']:
+        # soubor ze starší verze s jinými buckety přeskočíme
+        if n not in HISTOGRAMS or len(d) != len(HISTOGRAMS[n][1]) + 3:
+            continue
+        total = histograms.setdefault((n, l), [0] * len(d))
+        for i, v in enumerate(d):
+            total[i] += v
+
+
+def _worker_files(folder):
+    return [name for name in os.listdir(folder)
+            if name.startswith('metrics.') and name.endswith('.json') and name != EXITED_FILE]
+
+
+def collect():
+    """Sečte soubory běžících workerů a součet ukončených (čítače jsou kumulativní)."""
+    flush()
+    counters, histograms = {}, {}
+    if _folder is None:
+        _merge(counters, histograms, _snapshot())
+        return counters, histograms
+    exited = _read(os.path.join(_folder, EXITED_FILE)) or {'counters': [], 'histograms': [], 'folded': []}
+    _merge(counters, histograms, exited)
+    # soubor už přičtený do exited, který master ještě nestihl smazat, se nepočítá dvakrát
+    folded = set(exited['folded'])
+    for name in _worker_files(_folder):
+        if name in folded:
+            continue
+        data = _read(os.path.join(_folder, name))
+        if data is not None:
+            _merge(counters, histograms, data)
+    return counters, histograms
+
+
+def fold(folder, pid=None):
+    """Přičte soubory ukončených workerů (daného PID, jinak všechny) do EXITED_FILE a smaže je.
+
+    Volá gunicorn master – child_exit po skončení workeru, on_starting pro
+    soubory z předchozího běhu. Zapisuje jen master, zámek není potřeba.
+    """
+    if not os.path.isdir(folder):
+        return 0
+    path = os.path.join(folder, EXITED_FILE)
+    exited = _read(path) or {'counters': [], 'histograms': [], 'folded': []}
+    names = [n for n in _worker_files(folder) if pid is None or n.startswith(f'metrics.{pid}.')]
+    # smazané soubory z minulých volání už nemusíme pamatovat
+    folded = [n for n in exited['folded'] if os.path.exists(os.path.join(folder, n))]
+    names = [n for n in names if n not in folded]
+    if not names:
+        return 0
+    counters, histograms = {}, {}
+    _merge(counters, histograms, exited)
+    for name in names:
+        data = _read(os.path.join(folder, name))
+        if data is not None:
+            _merge(counters, histograms, data)
+    _write(path, {
+        'counters':   [[n, l, v] for (n, l), v in counters.items()],
+        'histograms': [[n, l, d] for (n, l), d in histograms.items()],
+        'folded':     folded + names,
+    })
+    # až po zápisu součtu; /metrics mezitím soubory podle `folded` přeskakuje
+    for name in names:
+        try:
+            os.remove(os.path.join(folder, name))
+        except OSError:
+            pass
+    return len(names)
+
+
+def render_latest():
+    counters, histograms = collect()
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for (n, l), v in sorted(counters.items()):
+            if n == name:
+                lines.append(f'{name}{{{l}}} {v}' if l else f'{name} {v}')
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (n, l), d in sorted(histograms.items()):
+            if n != name:
+                continue
+            prefix = l + ',' if l else ''
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], d[:-2]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            suffix = f'{{{l}}}' if l else ''
+            lines.append(f'{name}_sum{suffix} {d[-2]}')
+            lines.append(f'{name}_count{suffix} {d[-1]}')
+    return '\n'.join(lines) + '\n'
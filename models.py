@@ -16,9 +16,13 @@ class User(db.Model, UserMixin):
     credits         = db.Column(db.Integer, default=0)
     is_admin        = db.Column(db.Boolean, default=False)
     is_password_set = db.Column(db.Boolean, default=False)
+    created_at      = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)  # u starých účtů prázdné
     orders          = db.relationship('Order', backref='user', lazy=True)
     carts           = db.relationship('Cart', backref='user', lazy=True)
 
+    # credit_ledger odkazuje na ID i po smazání účtu – nové účty ho nesmí dostat znovu
+    __table_args__ = {'sqlite_autoincrement': True}
+
     def set_password(self, password):
         from werkzeug.security import generate_password_hash
         self.password = generate_password_hash(password)
@@ -35,6 +39,9 @@ class Product(db.Model):
     image_filename = db.Column(db.String(200), nullable=True)
     is_active = db.Column(db.Boolean, default=True)
 
+    # položky objednávek (i archivních) a statistiky odkazují na ID i po smazání produktu
+    __table_args__ = {'sqlite_autoincrement': True}
+
     @property
     def image_url(self):
         if self.image_filename:
@@ -65,8 +72,21 @@ class Order(db.Model):
     status           = db.Column(db.String(20), nullable=False, default='new')
     note             = db.Column(db.Text, nullable=True)          # poznámka od uživatele
     admin_note       = db.Column(db.Text, nullable=True)          # interní poznámka
+    # snapshot při vytvoření objednávky, historie tak nepotřebuje joiny
+    item_count       = db.Column(db.Integer, nullable=True)       # počet kusů
+    shipping_name    = db.Column(db.String(100), nullable=True)
+    shipping_price   = db.Column(db.Integer, nullable=True)
     items            = db.relationship('OrderItem', backref='order', lazy=True)
 
+    # ID archivovaných objednávek se nesmí přidělit znovu (archive.py)
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    is_archived = False
+
+    @property
+    def subtotal_price(self):
+        return self.total_price - (self.shipping_price or 0)
+
 
 class OrderItem(db.Model):
     id         = db.Column(db.Integer, primary_key=True)
@@ -74,12 +94,25 @@ class OrderItem(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity   = db.Column(db.Integer, nullable=False)
     price      = db.Column(db.Integer, nullable=False)  # Jednotková cena v době objednávky
-    # umožní v šabloně volat item.product.name
-    product    = relationship('Product', backref='order_items', lazy=True)
+    # snapshot produktu – objednávka se zobrazí i po smazání produktu
+    product_name  = db.Column(db.String(100), nullable=True)
+    product_image = db.Column(db.String(200), nullable=True)
+    line_total    = db.Column(db.Integer, nullable=True)
+    # passive_deletes: smazání produktu nesmí nulovat product_id ve starých objednávkách
+    product    = relationship('Product', backref=db.backref('order_items', lazy=True, passive_deletes='all'), lazy=True)
+
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    @property
+    def image_url(self):
+        if self.product_image:
+            return url_for('static', filename='uploads/' + self.product_image)
+        return url_for('static', filename='img/no-image.png')
 
 class Cart(db.Model):
-    id      = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    id         = db.Column(db.Integer, primary_key=True)
+    user_id    = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)  # pro úklid opuštěných košíků
     items   = db.relationship('CartItem', backref='cart', lazy=True)
 
 
@@ -98,4 +131,126 @@ class CartItem(db.Model):
     )
 
     # Jediná deklarace množství
-    quantity   = db.Column(db.Integer, nullable=False)
\ No newline at end of file
+    quantity   = db.Column(db.Integer, nullable=False)
+
+
+class SiteSetting(db.Model):
+    __tablename__ = 'site_setting'
+    key   = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Text, nullable=True)      # typ určuje site_settings.DEFAULTS
+
+
+# ——— KREDITY (viz credits.py) ———————————————————————————————————————————————
+# Každá změna User.credits má řádek v credit_ledger; do tabulky se jen přidává.
+# Bez cizích klíčů, aby záznamy zůstaly i po smazání uživatele nebo objednávky.
+
+class CreditLedger(db.Model):
+    __tablename__ = 'credit_ledger'
+    id         = db.Column(db.Integer, primary_key=True)
+    user_id    = db.Column(db.Integer, nullable=False)
+    delta      = db.Column(db.Integer, nullable=False)       # + připsáno, − odebráno
+    reason     = db.Column(db.String(20), nullable=False)    # opening / admin / bulk / csv / checkout
+    batch_id   = db.Column(db.String(32), nullable=True, index=True)   # hromadná operace
+    order_id   = db.Column(db.Integer, nullable=True)
+    created_by = db.Column(db.Integer, nullable=True)        # ID admina
+    note       = db.Column(db.String(200), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_credit_ledger_user_id_id', 'user_id', 'id'),)
+
+
+class CreditSnapshot(db.Model):
+    __tablename__ = 'credit_snapshot'
+    user_id    = db.Column(db.Integer, primary_key=True)
+    ledger_id  = db.Column(db.Integer, primary_key=True)    # poslední započtený záznam ledgeru
+    balance    = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ——— DOPORUČENÍ (plní recommendations.py) ————————————————————————————————————
+
+class ProductRecommendation(db.Model):
+    __tablename__  = 'product_recommendation'
+    product_id     = db.Column(db.Integer, primary_key=True)   # pro který produkt
+    rank           = db.Column(db.Integer, primary_key=True)   # 0 = nejsilnější
+    recommended_id = db.Column(db.Integer, nullable=False)
+    score          = db.Column(db.Integer, nullable=False)     # počet společných objednávek
+
+
+class ProductPair(db.Model):
+    # průběžná matice společných nákupů (mimo diagonálu, obě směry)
+    __tablename__ = 'product_pair'
+    product_id    = db.Column(db.Integer, primary_key=True)
+    other_id      = db.Column(db.Integer, primary_key=True)
+    count         = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RecommendationState(db.Model):
+    __tablename__ = 'recommendation_state'
+    id            = db.Column(db.Integer, primary_key=True)   # jediný řádek, id = 1
+    last_order_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at    = db.Column(db.DateTime, nullable=True)
+
+
+class ProductStats(db.Model):
+    __tablename__ = 'product_stats'
+    product_id    = db.Column(db.Integer, primary_key=True)
+    order_count   = db.Column(db.Integer, nullable=False, default=0)
+    units_sold    = db.Column(db.Integer, nullable=False, default=0, index=True)
+    revenue       = db.Column(db.Integer, nullable=False, default=0)
+
+
+# ——— ARCHIV (samostatná SQLite DB, viz archive.py) ——————————————————————————————
+# Doručené a zrušené objednávky starší než ARCHIVE_AFTER_DAYS se přesouvají sem,
+# aby živé tabulky zůstaly malé. Sloupce odpovídají Order / OrderItem, bez cizích klíčů.
+
+class ArchivedOrder(db.Model):
+    __bind_key__  = 'archive'
+    __tablename__ = 'order_archive'
+    id               = db.Column(db.Integer, primary_key=True)
+    user_id          = db.Column(db.Integer, nullable=False, index=True)
+    shipping_id      = db.Column(db.Integer, nullable=False)
+    shipping_address = db.Column(db.String(200), nullable=True)
+    total_price      = db.Column(db.Integer, nullable=False)
+    credits_used     = db.Column(db.Integer, default=0)
+    final_price      = db.Column(db.Integer, nullable=False)
+    created_at       = db.Column(db.DateTime)
+    is_completed     = db.Column(db.Boolean, default=False)
+    status           = db.Column(db.String(20), nullable=False)
+    note             = db.Column(db.Text, nullable=True)
+    admin_note       = db.Column(db.Text, nullable=True)
+    item_count       = db.Column(db.Integer, nullable=True)
+    shipping_name    = db.Column(db.String(100), nullable=True)
+    shipping_price   = db.Column(db.Integer, nullable=True)
+    archived_at      = db.Column(db.DateTime, default=datetime.utcnow)
+    items            = db.relationship('ArchivedOrderItem', backref='order', lazy=True)
+
+    is_archived = True
+
+    @property
+    def user(self):
+        # uživatel je v živé DB, relationship přes dvě databáze nejde
+        return db.session.get(User, self.user_id)
+
+    @property
+    def subtotal_price(self):
+        return self.total_price - (self.shipping_price or 0)
+
+
+class ArchivedOrderItem(db.Model):
+    __bind_key__  = 'archive'
+    __tablename__ = 'order_item_archive'
+    id            = db.Column(db.Integer, primary_key=True)
+    order_id      = db.Column(db.Integer, db.ForeignKey('order_archive.id'), nullable=False, index=True)
+    product_id    = db.Column(db.Integer, nullable=False)
+    quantity      = db.Column(db.Integer, nullable=False)
+    price         = db.Column(db.Integer, nullable=False)
+    product_name  = db.Column(db.String(100), nullable=True)
+    product_image = db.Column(db.String(200), nullable=True)
+    line_total    = db.Column(db.Integer, nullable=True)
+
+    @property
+    def image_url(self):
+        if self.product_image:
+            return url_for('static', filename='uploads/' + self.product_image)
+        return url_for('static', filename='img/no-image.png')
\ No newline at end of file
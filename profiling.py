@@ -0,0 +1,163 @@
+"""Vzorkovací profiler requestů.
+
+Je-li zapnutý (PROFILING_ENABLED), profiluje náhodný podíl requestů na každém
+endpointu (PROFILING_SAMPLE_RATE, případně PROFILING_ENDPOINT_RATES). Admin si
+může vynutit profilování jednoho requestu hlavičkou PROFILING_HEADER.
+
+Během profilovaného requestu vlákno sampleru v intervalu PROFILING_INTERVAL
+čte zásobník obslužného vlákna (sys._current_frames) a každý vzorek zařadí do
+kategorie db / jinja / python. Zásobníky se ukládají ve "folded" formátu
+(`kategorie;rámec;rámec počet`), který přímo čte flamegraph.pl i speedscope.
+Každý worker zapisuje do vlastního souboru, takže není potřeba zamykání mezi
+procesy; admin stránka soubory při čtení sloučí.
+
+Je-li profiler vypnutý, nezaregistruje žádné hooky a nic nestojí.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import current_app, g, request
+from flask_login import current_user
+
+CATEGORIES = ('db', 'jinja', 'python')
+
+# thread ident -> Counter vzorků právě profilovaného requestu
+_active = {}
+# endpoint -> Counter(folded zásobník -> počet vzorků), za celý proces
+_stacks = defaultdict(Counter)
+_lock = threading.Lock()
+_sampler = None
+
+
+def init_app(app):
+    app.config.setdefault('PROFILING_ENABLED', False)
+    app.config.setdefault('PROFILING_SAMPLE_RATE', 0.01)
+    app.config.setdefault('PROFILING_ENDPOINT_RATES', {})
+    app.config.setdefault('PROFILING_INTERVAL', 0.005)
+    app.config.setdefault('PROFILING_HEADER', 'X-Profile')
+    app.config.setdefault('PROFILING_DIR', os.path.join(app.instance_path, 'profiles'))
+    if not app.config['PROFILING_ENABLED']:
+        return
+
+    rates    = app.config['PROFILING_ENDPOINT_RATES']
+    default  = app.config['PROFILING_SAMPLE_RATE']
+    header   = app.config['PROFILING_HEADER']
+    interval = app.config['PROFILING_INTERVAL']
+
+    @app.before_request
+    def _start_profiling():
+        forced = request.headers.get(header) and current_user.is_authenticated and current_user.is_admin
+        if not forced and random.random() >= rates.get(request.endpoint, default):
+            return
+        _ensure_sampler(interval)
+        g._profile_samples = Counter()
+        _active[threading.get_ident()] = g._profile_samples
+
+    @app.teardown_request
+    def _stop_profiling(exc):
+        samples = _active.pop(threading.get_ident(), None)
+        if samples is None or not request.endpoint:
+            return
+        with _lock:
+            _stacks[request.endpoint].update(samples)
+            snapshot = dict(_stacks[request.endpoint])
+        # složka se čte až při zápisu – stejná, jakou čte /admin/profiling
+        _write_folded(current_app.config['PROFILING_DIR'], request.endpoint, snapshot)
+
+
+def _ensure_sampler(interval):
+    global _sampler
+    # po forku gunicorn workeru vlákno z mastera neexistuje
+    if _sampler is None or not _sampler.is_alive():
+        _sampler = threading.Thread(target=_sample_loop, args=(interval,), name='profiler', daemon=True)
+        _sampler.start()
+
+
+def _sample_loop(interval):
+    while True:
+        time.sleep(interval)
+        if not _active:
+            continue
+        frames = sys._current_frames()
+        for ident, samples in list(_active.items()):
+            frame = frames.get(ident)
+            if frame is not None:
+                samples[_fold(frame)] += 1
+
+
+def _fold(frame):
+    """Převede zásobník na `kategorie;vnější;...;vnitřní` od dispatch_request dál."""
+    names, files = [], []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)})')
+        files.append(code.co_filename)
+        if code.co_name == 'dispatch_request' and f'{os.sep}flask{os.sep}' in code.co_filename:
+            break
+        frame = frame.f_back
+    names.reverse()
+    return _category(files) + ';' + ';'.join(names)
+
+
+def _category(files):
+    # DB má přednost – lazy load v šabloně je čas strávený v databázi
+    if any(f'{os.sep}sqlalchemy{os.sep}engine' in f or f'{os.sep}sqlite3{os.sep}' in f for f in files):
+        return 'db'
+    if any(f'{os.sep}jinja2{os.sep}' in f or f.endswith('.html') for f in files):
+        return 'jinja'
+    return 'python'
+
+
+def _write_folded(folder, endpoint, stacks):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f'{endpoint}.{os.getpid()}.folded')
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for stack, count in stacks.items():
+            f.write(f'{stack} {count}\n')
+    os.replace(tmp, path)
+
+
+def load_profiles(folder):
+    """Sloučí folded soubory všech workerů: {endpoint: Counter(zásobník -> vzorky)}."""
+    profiles = defaultdict(Counter)
+    if not os.path.isdir(folder):
+        return profiles
+    for name in os.listdir(folder):
+        if not name.endswith('.folded'):
+            continue
+        endpoint = name.rsplit('.', 2)[0]
+        with open(os.path.join(folder, name), encoding='utf-8') as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdigit():
+                    profiles[endpoint][stack] += int(count)
+    return profiles
+
+
+def summarize(profiles, interval, top=20):
+    """Pro admin stránku: rozpad času na kategorie a nejžhavější zásobníky."""
+    endpoints = []
+    for endpoint, stacks in profiles.items():
+        split = Counter()
+        for stack, count in stacks.items():
+            split[stack.split(';', 1)[0]] += count
+        total = sum(split.values())
+        endpoints.append({
+            'endpoint': endpoint,
+            'samples':  total,
+            'ms':       round(total * interval * 1000),
+            'split':    {c: round(100 * split[c] / total, 1) if total else 0 for c in CATEGORIES},
+            'stacks':   [(stack, count, round(100 * count / total, 1))
+                         for stack, count in stacks.most_common(top)],
+        })
+    endpoints.sort(key=lambda e: e['samples'], reverse=True)
+    return endpoints
+
+
+def folded_text(stacks):
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.items())
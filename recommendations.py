@@ -0,0 +1,207 @@
+"""Doporučení „zákazníci také koupili" a žebříček nejprodávanějších produktů.
+
+Z položek objednávek se sestaví řídká matice objednávka × produkt (1 = produkt
+v objednávce byl). Součin M.T @ M je matice společných nákupů produkt × produkt,
+diagonála je počet objednávek s daným produktem. Vše se počítá vektorově
+v NumPy/SciPy, bez smyček přes objednávky. Zrušené objednávky se nepočítají.
+
+Průběžné součty jsou v DB vedle dat, ze kterých vznikly: product_pair
+(počet společných objednávek dvojice), product_stats (kusy, tržba) a
+recommendation_state (ID poslední zpracované objednávky). Vše se zapisuje
+v jedné transakci, takže obnova zálohy nebo jiná DATABASE_URL stav nerozbije.
+Inkrementální běh přičte jen nové objednávky a přepíše doporučení jen
+u produktů, kterých se týkaly. Objednávku zrušenou až po započtení opraví
+noční plný přepočet (cron.yaml).
+
+Výsledek pro web je v tabulce product_recommendation (top-K na produkt,
+primární klíč product_id + rank).
+
+Položky objednávek smazaný produkt přežijí, tabulka product je proto
+AUTOINCREMENT (ensure_monotonic_product_ids) – nový produkt nezdědí prodeje
+smazaného.
+"""
+from datetime import datetime
+
+import numpy as np
+from flask import current_app
+from scipy import sparse
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from db_upgrade import ensure_autoincrement
+
+from models import (
+    db, Product, Order, OrderItem, ArchivedOrder, ArchivedOrderItem,
+    ProductPair, ProductRecommendation, ProductStats, RecommendationState
+)
+
+EXCLUDED_STATUSES = ('cancelled',)
+
+
+def _fetch_items(item_model, order_model, min_order_id=0):
+    """Sloupce (order_id, product_id, quantity, price) nezrušených objednávek jako NumPy pole."""
+    rows = db.session.execute(
+        select(item_model.order_id, item_model.product_id, item_model.quantity, item_model.price)
+        .join(order_model, order_model.id == item_model.order_id)
+        .where(item_model.order_id > min_order_id, order_model.status.notin_(EXCLUDED_STATUSES))
+    ).all()
+    if not rows:
+        return np.zeros((0, 4), dtype=np.int64)
+    return np.array(rows, dtype=np.int64)
+
+
+def _max_order_id():
+    live = db.session.execute(select(func.max(OrderItem.order_id))).scalar() or 0
+    archived = db.session.execute(select(func.max(ArchivedOrderItem.order_id))).scalar() or 0
+    return max(live, archived)
+
+
+def ensure_monotonic_product_ids():
+    """ID produktu, na který odkazuje položka objednávky (živé i archivní), se znovu nepřidělí."""
+    live = db.session.execute(select(func.max(OrderItem.product_id))).scalar() or 0
+    archived = db.session.execute(select(func.max(ArchivedOrderItem.product_id))).scalar() or 0
+    db.session.commit()
+    ensure_autoincrement(Product, max(live, archived))
+
+
+def _cooccurrence(items, size):
+    """Matice společných nákupů produkt × produkt pro dané položky."""
+    _, order_rows = np.unique(items[:, 0], return_inverse=True)
+    presence = sparse.csr_matrix(
+        (np.ones(len(items), dtype=np.int64), (order_rows, items[:, 1])),
+        shape=(order_rows.max() + 1, size),
+    )
+    # víc řádků stejného produktu v jedné objednávce se počítá jednou
+    presence.data[:] = 1
+    return (presence.T @ presence).tocoo()
+
+
+def _upsert(model, keys, rows):
+    """INSERT ... ON CONFLICT DO UPDATE, který k existujícím součtům přičte nové."""
+    if not rows:
+        return
+    stmt = sqlite_insert(model)
+    counters = [c.name for c in model.__table__.columns if c.name not in keys]
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: getattr(model, name) + stmt.excluded[name] for name in counters},
+        ),
+        rows,
+    )
+
+
+def _top_k(row_ids, cols, scores, allowed, k):
+    """Vektorově vybere top-K sloupců pro každý řádek; vrací (řádek, rank, sloupec, skóre)."""
+    keep = allowed[cols]
+    row_ids, cols, scores = row_ids[keep], cols[keep], scores[keep]
+    # seřadit podle řádku vzestupně, skóre sestupně (při shodě menší ID produktu)
+    order = np.lexsort((cols, -scores, row_ids))
+    row_ids, cols, scores = row_ids[order], cols[order], scores[order]
+    starts = np.searchsorted(row_ids, row_ids, side='left')
+    ranks = np.arange(len(row_ids)) - starts
+    keep = ranks < k
+    return row_ids[keep], ranks[keep], cols[keep], scores[keep]
+
+
+def _load_pairs(products):
+    """Dvojice z product_pair pro dané produkty (čtení přes primární klíč)."""
+    rows = []
+    for start in range(0, len(products), 500):
+        rows.extend(db.session.execute(
+            select(ProductPair.product_id, ProductPair.other_id, ProductPair.count)
+            .where(ProductPair.product_id.in_(products[start:start + 500]))
+        ).all())
+    if not rows:
+        return np.zeros((0, 3), dtype=np.int64)
+    return np.array(rows, dtype=np.int64)
+
+
+def refresh(full=False, top_k=None):
+    """Přičte nové objednávky a přepočítá doporučení; vrací počet zpracovaných položek."""
+    top_k = top_k or current_app.config.get('RECOMMENDATIONS_TOP_K', 8)
+    state = db.session.get(RecommendationState, 1)
+    # stav novější než data (obnovená záloha, jiná DB) znamená plný přepočet
+    if state is not None and state.last_order_id > _max_order_id():
+        full = True
+
+    if full or state is None:
+        ProductPair.query.delete(synchronize_session=False)
+        ProductStats.query.delete(synchronize_session=False)
+        ProductRecommendation.query.delete(synchronize_session=False)
+        last_order_id = 0
+        items = np.concatenate([_fetch_items(OrderItem, Order),
+                                _fetch_items(ArchivedOrderItem, ArchivedOrder)])
+    else:
+        last_order_id = state.last_order_id
+        items = _fetch_items(OrderItem, Order, last_order_id)
+        if len(items) == 0:
+            return 0
+
+    if len(items):
+        size = int(items[:, 1].max()) + 1
+        cooc = _cooccurrence(items, size)
+        units_sold = np.bincount(items[:, 1], weights=items[:, 2], minlength=size).astype(np.int64)
+        revenue = np.bincount(items[:, 1], weights=items[:, 2] * items[:, 3], minlength=size).astype(np.int64)
+        diagonal = cooc.row == cooc.col
+        order_counts = np.zeros(size, dtype=np.int64)
+        order_counts[cooc.row[diagonal]] = cooc.data[diagonal]
+
+        _upsert(ProductPair, ['product_id', 'other_id'], [
+            {'product_id': p, 'other_id': o, 'count': c}
+            for p, o, c in zip(cooc.row[~diagonal].tolist(), cooc.col[~diagonal].tolist(),
+                               cooc.data[~diagonal].tolist())
+        ])
+        sold = np.nonzero(units_sold)[0]
+        _upsert(ProductStats, ['product_id'], [
+            {'product_id': p, 'order_count': o, 'units_sold': u, 'revenue': r}
+            for p, o, u, r in zip(sold.tolist(), order_counts[sold].tolist(),
+                                  units_sold[sold].tolist(), revenue[sold].tolist())
+        ])
+
+        # doporučení – přepíšeme jen dotčené produkty
+        affected = np.unique(items[:, 1]).tolist()
+        pairs = _load_pairs(affected)
+        max_product = db.session.execute(select(func.max(Product.id))).scalar() or 0
+        allowed = np.zeros(max(max_product, int(pairs[:, 1].max()) if len(pairs) else 0) + 1, dtype=bool)
+        active_ids = db.session.execute(select(Product.id).where(Product.is_active.is_(True))).scalars().all()
+        allowed[np.array(active_ids, dtype=np.int64)] = True
+        row_ids, ranks, cols, scores = _top_k(pairs[:, 0], pairs[:, 1], pairs[:, 2], allowed, top_k)
+
+        for start in range(0, len(affected), 500):
+            ProductRecommendation.query.filter(
+                ProductRecommendation.product_id.in_(affected[start:start + 500])
+            ).delete(synchronize_session=False)
+        if len(row_ids):
+            db.session.execute(insert(ProductRecommendation), [
+                {'product_id': p, 'rank': r, 'recommended_id': c, 'score': s}
+                for p, r, c, s in zip(row_ids.tolist(), ranks.tolist(), cols.tolist(), scores.tolist())
+            ])
+
+    # objednávka se zakládá i s položkami v jedné transakci, stačí nejvyšší zpracované ID
+    if state is None:
+        state = RecommendationState(id=1)
+        db.session.add(state)
+    state.last_order_id = max(last_order_id, int(items[:, 0].max()) if len(items) else 0)
+    state.updated_at = datetime.utcnow()
+    db.session.commit()
+    return len(items)
+
+
+def related_products(product_id, limit=4):
+    """„Zákazníci také koupili" – jeden dotaz přes primární klíč product_recommendation."""
+    return Product.query\
+        .join(ProductRecommendation, ProductRecommendation.recommended_id == Product.id)\
+        .filter(ProductRecommendation.product_id == product_id)\
+        .order_by(ProductRecommendation.rank)\
+        .limit(limit)\
+        .all()
+
+
+def best_sellers(limit=10):
+    """Nejprodávanější produkty: [(Product, ProductStats)] podle prodaných kusů."""
+    return db.session.query(Product, ProductStats)\
+        .join(ProductStats, ProductStats.product_id == Product.id)\
+        .order_by(ProductStats.units_sold.desc())\
+        .limit(limit)\
+        .all()
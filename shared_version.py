@@ -0,0 +1,64 @@
+"""Číslo verze sdílené mezi gunicorn workery jedné instance.
+
+Verze je délka souboru `VERSIONS_DIR/<název>` (výchozí adresář je v /tmp,
+jediném zapisovatelném místě na App Engine; workery jedné instance ho
+sdílejí). Zvýšení je připsání jednoho bajtu v režimu O_APPEND, které je
+atomické i při souběžném zápisu z více procesů. Zjištění verze stojí jen
+os.stat, takže ho lze volat na každém requestu bez dotazu do databáze.
+
+VersionedCache nad ní drží v paměti procesu hodnotu z loaderu (nastavení,
+způsoby dopravy) a načte ji znovu, jen když se verze změnila.
+"""
+import os
+
+from flask import current_app, g, has_request_context
+
+
+class SharedVersion:
+    def __init__(self, name):
+        self.name = name
+
+    def _path(self):
+        return os.path.join(current_app.config['VERSIONS_DIR'], self.name)
+
+    def current(self):
+        try:
+            return os.stat(self._path()).st_size
+        except FileNotFoundError:
+            return 0
+
+    def bump(self):
+        path = self._path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, b'.')
+        finally:
+            os.close(fd)
+
+
+class VersionedCache:
+    """Hodnota z `loader()` v paměti procesu; v rámci requestu se verze ověřuje jen jednou."""
+
+    def __init__(self, name, loader):
+        self.version = SharedVersion(name)
+        self.loader = loader
+        self._g_key = f'_cache_{name}'
+        self._cache = None  # (verze, hodnota)
+
+    def get(self):
+        if has_request_context() and self._g_key in g:
+            return g.get(self._g_key)
+        # verzi čteme před načtením z DB – případný souběžný zápis vynutí další reload
+        version = self.version.current()
+        if self._cache is None or self._cache[0] != version:
+            self._cache = (version, self.loader())
+        if has_request_context():
+            setattr(g, self._g_key, self._cache[1])
+        return self._cache[1]
+
+    def invalidate(self):
+        """Zneplatní hodnotu ve všech workerech (volat po commitu změny)."""
+        self.version.bump()
+        if has_request_context():
+            g.pop(self._g_key, None)
@@ -0,0 +1,39 @@
+"""Aktivní způsoby dopravy z paměti procesu.
+
+Doprava se mění jen v administraci, košík a checkout ji ale potřebují na
+každém requestu. active_methods() drží aktivní metody v paměti; admin
+routy po změně zavolají invalidate(), které zvýší sdílenou verzi, a ostatní
+workery si při dalším requestu seznam znovu načtou (shared_version.VersionedCache).
+"""
+from collections import namedtuple
+
+from models import Shipping
+from shared_version import VersionedCache
+
+# neměnná kopie řádku – nepatří do session, lze ji sdílet mezi requesty
+ShippingMethod = namedtuple('ShippingMethod', 'id name price description')
+
+def _load():
+    rows = Shipping.query.with_entities(Shipping.id, Shipping.name, Shipping.price, Shipping.description)\
+        .filter(Shipping.active.is_(True))\
+        .order_by(Shipping.id)\
+        .all()
+    methods = [ShippingMethod(*row) for row in rows]
+    return methods, {m.id: m for m in methods}
+
+
+_cache = VersionedCache('shipping', _load)  # ([ShippingMethod], {id: ShippingMethod})
+
+
+def active_methods():
+    return _cache.get()[0]
+
+
+def resolve(shipping_id):
+    """Vybraná metoda; neplatnou volbu nahradí první aktivní metodou."""
+    methods, by_id = _cache.get()
+    return by_id.get(shipping_id) or (methods[0] if methods else None)
+
+
+def invalidate():
+    _cache.invalidate()
@@ -0,0 +1,86 @@
+"""Nastavení webu uložená v tabulce site_setting.
+
+get_settings() vrací typovaný objekt z paměti procesu. Zápis přes
+save_settings() zvýší sdílenou verzi a ostatní workery si při dalším
+requestu nastavení znovu načtou; jinak se do DB nesahá.
+"""
+from models import db, SiteSetting
+from shared_version import VersionedCache
+
+# klíč: (výchozí hodnota, typ)
+DEFAULTS = {
+    'site_name':            ('RealityShop', str),
+    'site_description':     ('', str),
+    'contact_email':        ('', str),
+    'contact_phone':        ('', str),
+    'logo':                 ('', str),
+    'favicon':              ('', str),
+    'footer_text':          ('© 2025 SMS reality - Interní e-shop pro realitní makléře', str),
+    'social_facebook':      ('', str),
+    'social_instagram':     ('', str),
+    'analytics_code':       ('', str),
+    'maintenance_mode':     (False, bool),
+    'currency':             ('CZK', str),
+    'products_per_page':    (12, int),
+    # zatím nepropojené (sklad, nákup bez registrace, recenze) – formulář je jen zobrazí
+    'show_out_of_stock':    (True, bool),
+    'allow_guest_checkout': (False, bool),
+    'enable_reviews':       (False, bool),
+    'low_stock_threshold':  (5, int),
+}
+
+# které klíče patří ke kterému formuláři v admin/settings.html
+SECTIONS = {
+    'general': ['site_name', 'site_description', 'contact_email', 'contact_phone', 'footer_text',
+                'social_facebook', 'social_instagram', 'analytics_code', 'maintenance_mode'],
+    'store':   ['currency', 'products_per_page'],
+}
+
+CURRENCY_SYMBOLS = {'CZK': 'Kč', 'EUR': '€', 'USD': '$', 'GBP': '£', 'CREDITS': 'kreditů'}
+
+class Settings:
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+    @property
+    def currency_symbol(self):
+        return CURRENCY_SYMBOLS.get(self.currency, self.currency)
+
+
+def _convert(key, raw):
+    default, type_ = DEFAULTS[key]
+    if raw is None:
+        return default
+    if type_ is bool:
+        return raw in ('1', 'true', 'True', 'on')
+    if type_ is int:
+        try:
+            return int(raw)
+        except ValueError:
+            return default
+    return raw
+
+
+def _load():
+    stored = dict(db.session.query(SiteSetting.key, SiteSetting.value).all())
+    return Settings({key: _convert(key, stored.get(key)) for key in DEFAULTS})
+
+
+_cache = VersionedCache('site_settings', _load)
+
+
+def get_settings():
+    """Aktuální nastavení; v rámci requestu se verze ověřuje jen jednou."""
+    return _cache.get()
+
+
+def save_settings(values):
+    """Uloží {klíč: hodnota} a zneplatní cache ve všech workerech."""
+    for key, value in values.items():
+        if key not in DEFAULTS:
+            continue
+        if isinstance(value, bool):
+            value = '1' if value else '0'
+        db.session.merge(SiteSetting(key=key, value=str(value)))
+    db.session.commit()
+    _cache.invalidate()
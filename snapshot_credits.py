@@ -0,0 +1,12 @@
+"""Snapshot zůstatků kreditů a kontrola proti ledgeru: python snapshot_credits.py"""
+from app import app, db
+from credits import ensure_opening_balances, mismatched_balances, snapshot_balances
+from db_upgrade import add_missing_columns
+
+with app.app_context():
+    db.create_all()
+    add_missing_columns()
+    ensure_opening_balances()
+    print(f'Nové snapshoty: {snapshot_balances()}')
+    for user_id, balance, ledger in mismatched_balances():
+        print(f'Uživatel {user_id}: kredity {balance}, podle ledgeru {ledger}')
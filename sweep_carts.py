@@ -0,0 +1,14 @@
+"""Ruční úklid košíků (jinak běží přes cron.yaml): python sweep_carts.py [dní]"""
+import sys
+
+from app import app, db
+from carts import sweep_carts
+from db_upgrade import add_missing_columns
+
+with app.app_context():
+    db.create_all()
+    add_missing_columns()
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else app.config['CART_ABANDONED_DAYS']
+    result = sweep_carts(days)
+    print(f"Smazáno košíků – hostů: {result['guest']}, prázdných: {result['empty']}, "
+          f"opuštěných: {result['abandoned']}")
@@ -0,0 +1,82 @@
+"""Předkompilované šablony, warm-up workerů a měření doby vykreslení.
+
+Bytecode zkompilovaných šablon leží v JINJA_BYTECODE_CACHE_DIR (výchozí
+jinja_cache/ vedle aplikace). Adresář se naplní při nasazení:
+
+    python precompile_templates.py && gcloud app deploy
+
+a všechny workery z něj jen čtou. Klíčem je název šablony (ne absolutní
+cesta), takže cache vytvořená na jiném stroji platí i na App Engine;
+změněnou šablonu pozná Jinja podle kontrolního součtu zdrojáku. Bytecode
+je vázaný na verzi Pythonu – skript spouštějte stejnou verzí, jakou má
+runtime v app.yaml, jinak se šablony zkompilují znovu při warm-upu.
+
+warm_up() načte všechny šablony dřív, než worker přijme první request
+(gunicorn.conf.py, /_ah/warmup). Doba vykreslení každé šablony jde do
+histogramu template_render_seconds v /metrics.
+"""
+import os
+import time
+
+from flask import before_render_template, g, request, template_rendered
+from jinja2 import FileSystemBytecodeCache, TemplateSyntaxError
+
+import metrics
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache s klíčem podle názvu šablony a tolerancí read-only FS."""
+
+    def get_cache_key(self, name, filename=None):
+        return super().get_cache_key(name)
+
+    def dump_bytecode(self, bucket):
+        # na App Engine je souborový systém jen pro čtení – šablona pak zůstane
+        # zkompilovaná jen v paměti workeru
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+def init_app(app):
+    app.config.setdefault('JINJA_BYTECODE_CACHE_DIR', os.path.join(app.root_path, 'jinja_cache'))
+    folder = app.config['JINJA_BYTECODE_CACHE_DIR']
+    if folder:
+        try:
+            os.makedirs(folder, exist_ok=True)
+        except OSError:
+            pass
+        if os.path.isdir(folder):
+            app.jinja_env.bytecode_cache = TemplateBytecodeCache(folder)
+
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_record_render, app)
+
+
+def _start_render(sender, template, context, **extra):
+    g.setdefault('_template_started', []).append(time.perf_counter())
+
+
+def _record_render(sender, template, context, **extra):
+    started = g.get('_template_started')
+    if not started:
+        return
+    metrics.observe('template_render_seconds', time.perf_counter() - started.pop(),
+                    template=template.name, endpoint=request.endpoint or 'unknown')
+
+
+def warm_up(app):
+    """Načte (a případně zkompiluje) všechny šablony; vrací (počet, chyby)."""
+    loaded, errors = 0, []
+    with app.app_context():
+        env = app.jinja_env
+        for name in env.list_templates():
+            try:
+                env.get_template(name)
+                loaded += 1
+            except TemplateSyntaxError as e:
+                errors.append(f'{name}:{e.lineno}: {e.message}')
+    for error in errors:
+        app.logger.warning('Šablonu nelze zkompilovat: %s', error)
+    return loaded, errors